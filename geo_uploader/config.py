@@ -54,9 +54,74 @@ class BaseConfig:
     DATABASE_PATH = os.path.join(DATA_ROOT, "database")
     BACKUP_PATH = os.path.join(DATA_ROOT, "backups")
     JOB_PATH = os.path.join(DATA_ROOT, "jobs")
+    CACHE_FOLDER = os.path.join(DATA_ROOT, "cache")
 
     BASE_EXCEL = os.path.join(PROJECT_ROOT, "geo_uploader/utils/metadata/seq_template.xlsx")
 
+    # Jobs of each type running at the same time (0 for no limit), the others wait
+    # in the queue, re-uploads and small sessions first
+    MAX_MD5_JOBS = int(os.environ.get("MAX_MD5_JOBS", 2))
+    MAX_UPLOAD_JOBS = int(os.environ.get("MAX_UPLOAD_JOBS", 2))
+    # Times a job is started again when its process was lost (jobs-worker restart)
+    JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 2))
+    # Number of files hashed in parallel by the bulk_md5 job
+    MD5_WORKERS = int(os.environ.get("MD5_WORKERS", 4))
+    # Hash files in the upload job instead of a separate MD5 job (reads every file once)
+    SINGLE_PASS_TRANSFER = os.environ.get("SINGLE_PASS_TRANSFER", "false").lower() in (
+        "true",
+        "1",
+        "yes",
+        "on",
+    )
+    # Decompress .gz files while hashing them, catching truncated or corrupt uploads
+    MD5_VERIFY_GZIP = os.environ.get("MD5_VERIFY_GZIP", "false").lower() in (
+        "true",
+        "1",
+        "yes",
+        "on",
+    )
+    # Count the reads of FASTQ files while hashing them and check the R1/R2 pairs
+    MD5_FASTQ_STATS = os.environ.get("MD5_FASTQ_STATS", "false").lower() in (
+        "true",
+        "1",
+        "yes",
+        "on",
+    )
+    # Parallel FTP connections of the bulk_upload job, a single stream is capped by latency
+    FTP_CONNECTIONS = int(os.environ.get("FTP_CONNECTIONS", 4))
+    # Block size of the FTP transfers in bytes, or "auto" to probe it at the start of the job.
+    # Only the block size is probed, the send buffer stays FTP_SNDBUF
+    FTP_BLOCKSIZE = os.environ.get("FTP_BLOCKSIZE", str(1024 * 1024))
+    # Send buffer of the FTP data connections in bytes (0 for the system default)
+    FTP_SNDBUF = int(os.environ.get("FTP_SNDBUF", 4 * 1024 * 1024))
+    # Blocks read ahead of every FTP connection by a reader thread (0 to disable),
+    # overlapping the storage and network latency on network filesystems
+    FTP_READAHEAD = int(os.environ.get("FTP_READAHEAD", 0))
+    # Files of this size or more are sent in FTP_SEGMENT_STREAMS concurrent byte ranges
+    # (0 to disable), so that a huge file does not finish alone on a single stream
+    FTP_SEGMENT_THRESHOLD_MB = int(os.environ.get("FTP_SEGMENT_THRESHOLD_MB", 10240))
+    FTP_SEGMENT_STREAMS = int(os.environ.get("FTP_SEGMENT_STREAMS", 4))
+    # Order of the uploads: largest_first (shortest total time), processed_first or ini
+    FTP_UPLOAD_ORDER = os.environ.get("FTP_UPLOAD_ORDER", "largest_first")
+    # Upload bandwidth (MB/s) shared by all the running upload jobs, 0 for unlimited,
+    # and time-of-day windows overriding it, e.g. "08:00-18:00=50, 18:00-08:00=0"
+    FTP_BANDWIDTH_LIMIT_MBPS = float(os.environ.get("FTP_BANDWIDTH_LIMIT_MBPS", 0))
+    FTP_BANDWIDTH_SCHEDULE = os.environ.get("FTP_BANDWIDTH_SCHEDULE", "")
+    # Send the files with sendfile, without copying them through the upload process
+    FTP_SENDFILE = os.environ.get("FTP_SENDFILE", "true").lower() in (
+        "true",
+        "1",
+        "yes",
+        "on",
+    )
+    # Checksums shared across sessions, keyed by path, inode, size and mtime
+    CHECKSUM_CACHE_MAX_AGE_DAYS = int(
+        os.environ.get("CHECKSUM_CACHE_MAX_AGE_DAYS", 180)
+    )
+    CHECKSUM_CACHE_MAX_ENTRIES = int(
+        os.environ.get("CHECKSUM_CACHE_MAX_ENTRIES", 100000)
+    )
+
     GEO_SERVER = get_required_env("GEO_SERVER")
     GEO_USERNAME = get_required_env("GEO_USERNAME")
 
@@ -87,6 +152,7 @@ class BaseConfig:
             cls.UPLOAD_FOLDER,
             cls.LOG_FOLDER,
             cls.DATABASE_PATH,
+            cls.CACHE_FOLDER,
         ]
 
         for directory in dirs_to_create:
@@ -123,6 +189,7 @@ class DevelopmentConfig(BaseConfig):
     DATABASE_PATH = os.path.join(DATA_ROOT, "database")
     BACKUP_PATH = os.path.join(DATA_ROOT, "backups")
     INSTANCE_FOLDER_PATH = os.path.join(DATA_ROOT, "instance")
+    CACHE_FOLDER = os.path.join(DATA_ROOT, "cache")
 
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         "SQLALCHEMY_DATABASE_URI_DEV",
@@ -0,0 +1,219 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from geo_uploader.config import get_config
+from geo_uploader.services.external.job_service import JobService
+
+# Runs the job script and writes its exit code to a file, so that a runner which
+# restarted (and is no longer the parent of the job) can still tell how it ended
+EXIT_CODE_WRAPPER = (
+    "import subprocess, sys\n"
+    "code = subprocess.call(sys.argv[2:])\n"
+    "with open(sys.argv[1], 'w') as f:\n"
+    "    f.write(str(code))\n"
+    "sys.exit(code)\n"
+)
+
+
+class JobRunner:
+    """Long-lived process running the jobs queued by the web server.
+
+    The queued jobs are started by priority then smallest session first, with at
+    most MAX_MD5_JOBS MD5 jobs and MAX_UPLOAD_JOBS upload jobs running at the same
+    time, the others staying PENDING.
+
+    The job processes are started in their own session, so they survive a restart
+    of the runner. On startup, the runner reconciles the jobs left RUNNING: a job
+    whose process is still alive is adopted, one which ended meanwhile is finished
+    from its exit code file, and one whose process was lost is queued again (up to
+    JOB_MAX_ATTEMPTS times, then marked as failed).
+    """
+
+    def __init__(self, job_service=None, config=None, logger=None):
+        """
+        Initialize the JobRunner.
+
+        Args:
+            job_service: JobService instance (optional)
+            config: Configuration object, defaults to app config if None
+            logger: Logger instance, defaults to class logger if None
+        """
+        self.config = config or get_config()
+        self.logger = logger or logging.getLogger(__name__)
+        self.job_service = job_service or JobService(logger=self.logger)
+
+        # Jobs started by this runner, and jobs adopted from a previous runner
+        self._processes: dict[int, subprocess.Popen] = {}
+        self._adopted: dict[int, int] = {}
+        self._stopping = False
+
+    def run(self, poll_interval: float = 2.0) -> None:
+        """
+        Run the queued jobs until SIGINT/SIGTERM. The running jobs are left
+        running, to be adopted by the next runner.
+
+        Args:
+            poll_interval: Seconds between two checks of the queue and the jobs
+        """
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.reconcile_jobs()
+        self.logger.info(f"Job runner started (PID {os.getpid()})")
+        while not self._stopping:
+            self.check_jobs()
+            self.start_pending_jobs()
+            time.sleep(poll_interval)
+
+        running = len(self._processes) + len(self._adopted)
+        self.logger.info(f"Job runner stopped, {running} job(s) left running")
+
+    def reconcile_jobs(self) -> None:
+        """Adopt, finish or requeue the jobs left RUNNING by a previous runner"""
+        for job_info in self.job_service.get_jobs(status="RUNNING"):
+            job_id = job_info["job_id"]
+            pid = job_info.get("pid")
+            if pid and self._is_job_process(pid, job_info):
+                self._adopted[job_id] = pid
+                self.logger.info(f"Adopted job {job_id} (PID {pid})")
+                continue
+
+            return_code = self._read_exit_code(job_info)
+            if return_code is not None:
+                self.job_service.finish_job(job_id, return_code)
+            else:
+                self._handle_lost_job(job_info)
+
+    def start_pending_jobs(self) -> None:
+        """Start the queued jobs, as long as their type is below its limit of
+        running jobs (MAX_MD5_JOBS, MAX_UPLOAD_JOBS)"""
+        limits = {
+            "md5": self.config.MAX_MD5_JOBS,
+            "upload": self.config.MAX_UPLOAD_JOBS,
+        }
+        while not self._stopping:
+            job_info = self.job_service.claim_next_job(limits)
+            if not job_info:
+                return
+            self._start_job(job_info)
+
+    def check_jobs(self) -> None:
+        """Finish the jobs whose process ended, and stop the cancelled ones"""
+        for job_id, process in list(self._processes.items()):
+            return_code = process.poll()
+            if return_code is not None:
+                del self._processes[job_id]
+                self.job_service.finish_job(job_id, return_code)
+            elif self._is_cancelled(job_id):
+                self._terminate(job_id, process.pid)
+
+        for job_id, pid in list(self._adopted.items()):
+            job_info = self.job_service.get_job_info(job_id)
+            if job_info and self._is_job_process(pid, job_info):
+                if job_info["status"] == "CANCELLED":
+                    self._terminate(job_id, pid)
+                continue
+
+            del self._adopted[job_id]
+            if job_info and job_info["status"] == "RUNNING":
+                return_code = self._read_exit_code(job_info)
+                if return_code is not None:
+                    self.job_service.finish_job(job_id, return_code)
+                else:
+                    self._handle_lost_job(job_info)
+
+    def _start_job(self, job_info: dict[str, Any]) -> None:
+        job_id = job_info["job_id"]
+        script_path = job_info["script_path"]
+        try:
+            # Prepare command
+            cmd = [sys.executable, script_path]
+            if job_info.get("script_options"):
+                cmd.append(job_info["script_options"])
+
+            # Create log files
+            log_dir = Path(job_info["log_dir"])
+            log_dir.mkdir(parents=True, exist_ok=True)
+            exit_file = self._exit_file(job_info)
+            exit_file.unlink(missing_ok=True)
+
+            stdout_file = log_dir / f"{job_info['name']}.out"
+            stderr_file = log_dir / f"{job_info['name']}.err"
+            with open(stdout_file, "w") as stdout_f, open(stderr_file, "w") as stderr_f:
+                process = subprocess.Popen(
+                    [sys.executable, "-c", EXIT_CODE_WRAPPER, str(exit_file), *cmd],
+                    stdout=stdout_f,
+                    stderr=stderr_f,
+                    cwd=os.path.dirname(script_path),
+                    start_new_session=True,
+                )
+
+            self._processes[job_id] = process
+            self.job_service.set_job_process(job_id, process.pid)
+            self.logger.info(f"Started job {job_id} (PID {process.pid})")
+
+        except Exception as e:
+            self.logger.error(f"Job {job_id} failed with error: {e}")
+            self.job_service.finish_job(job_id, None, error=str(e))
+
+    def _handle_lost_job(self, job_info: dict[str, Any]) -> None:
+        """Requeue a job whose process disappeared without an exit code"""
+        job_id = job_info["job_id"]
+        if job_info.get("attempts", 0) < self.config.JOB_MAX_ATTEMPTS:
+            self.job_service.requeue_job(job_id)
+            self.logger.warning(f"Job {job_id} was interrupted, queued again")
+        else:
+            self.job_service.finish_job(
+                job_id, None, error="The job was interrupted too many times"
+            )
+            self.logger.error(f"Job {job_id} was interrupted, marked as failed")
+
+    def _is_cancelled(self, job_id: int) -> bool:
+        job_info = self.job_service.get_job_info(job_id)
+        return not job_info or job_info["status"] == "CANCELLED"
+
+    def _terminate(self, job_id: int, pid: int) -> None:
+        """Stop the process group of a cancelled job"""
+        try:
+            os.killpg(pid, signal.SIGTERM)
+            self.logger.info(f"Stopped cancelled job {job_id} (PID {pid})")
+        except OSError as e:
+            self.logger.warning(f"Could not stop job {job_id} (PID {pid}): {e}")
+
+    def _stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    @staticmethod
+    def _is_job_process(pid: int, job_info: dict[str, Any]) -> bool:
+        """Whether the process is alive and still runs the script of the job, and
+        not another process which reused its PID"""
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # Alive, but belongs to another user so is not the job
+            return False
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().decode(errors="replace")
+        except OSError:
+            # No /proc on this platform, trust the PID
+            return True
+        return job_info["script_path"] in cmdline
+
+    @staticmethod
+    def _exit_file(job_info: dict[str, Any]) -> Path:
+        return Path(job_info["log_dir"]) / f"job_{job_info['job_id']}.exit"
+
+    def _read_exit_code(self, job_info: dict[str, Any]) -> int | None:
+        try:
+            return int(self._exit_file(job_info).read_text())
+        except (OSError, ValueError):
+            return None
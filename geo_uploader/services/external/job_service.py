@@ -1,11 +1,10 @@
 import json
 import logging
 import os
-import sys
 import shutil
-import subprocess
+import sqlite3
 import threading
-import time
+from contextlib import closing
 from datetime import datetime
 from pathlib import Path
 from typing import Any
@@ -15,139 +14,351 @@ from geo_uploader.config import get_config
 logger = logging.getLogger(__name__)
 
 
+# Columns of the jobs table, besides the job_id
+JOB_COLUMNS = (
+    "name",
+    "session",
+    "script_path",
+    "script_options",
+    "status",
+    "submit_time",
+    "start_time",
+    "end_time",
+    "elapsed",
+    "return_code",
+    "log_dir",
+    "stdout_file",
+    "stderr_file",
+    "error",
+    "pid",
+    "attempts",
+    "job_type",
+    "priority",
+    "size",
+)
+
+# Statuses of the jobs which are not finished
+ACTIVE_STATUSES = ("PENDING", "RUNNING")
+
+# Types of jobs whose number running at the same time is limited (see JobRunner)
+JOB_TYPES = ("md5", "upload")
+
+# Priorities of the queued jobs, re-uploads only send the missing files so go first
+PRIORITY_NORMAL = 0
+PRIORITY_REUPLOAD = 1
+
+# Order in which the pending jobs are started: highest priority, then smallest
+# session, then oldest
+QUEUE_ORDER = "priority DESC, size, job_id"
+
+# Columns added to the jobs table since its creation
+ADDED_COLUMNS = {
+    "pid": "INTEGER",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "job_type": "TEXT",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "size": "INTEGER NOT NULL DEFAULT 0",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    session TEXT,
+    script_path TEXT NOT NULL,
+    script_options TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    submit_time TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    elapsed TEXT,
+    return_code INTEGER,
+    log_dir TEXT,
+    stdout_file TEXT,
+    stderr_file TEXT,
+    error TEXT,
+    pid INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    job_type TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session);
+"""
+
+# Created once the columns of an older jobs table were added
+QUEUE_INDEX = f"CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, {QUEUE_ORDER})"
+
+
 class JobService:
-    """Service for handling background job submissions on local machines"""
+    """Service for handling background job submissions on local machines
 
-    # Class-level job tracking
-    _jobs: dict[int, dict[str, Any]] = {}
-    _next_job_id: int = 1
-    _lock = threading.Lock()
+    The jobs are stored in a SQLite database (JOB_PATH/jobs.db) in WAL mode, shared
+    by all the processes of the application: every lookup is a query on the
+    primary key or an index, and every status change a single UPDATE.
+    The web server only queues the jobs, they are run by the jobs-worker process
+    (see JobRunner).
+    """
+
+    # Databases whose schema was already created by this process
+    _initialized: set[str] = set()
+    _init_lock = threading.Lock()
 
     def __init__(self, logger=None):
         self.logger = logger or logging.getLogger(__name__)
         # Create jobs directory for tracking
         self._jobs_dir = Path(get_config().JOB_PATH)
-
-        self._jobs_dir.mkdir(parents=True, exist_ok=True)
-        self._load_existing_jobs()
-
-    def _load_existing_jobs(self):
-        """Load existing jobs from disk on startup"""
-        jobs_file = self._jobs_dir / "jobs.json"
-        if jobs_file.exists():
-            try:
-                with open(jobs_file) as f:
-                    data = json.load(f)
-                    self._jobs = data.get("jobs", {})
-                    # Convert string keys back to int
-                    self._jobs = {int(k): v for k, v in self._jobs.items()}
-                    self._next_job_id = data.get("next_id", 1)
-            except Exception as e:
-                self.logger.warning(f"Could not load existing jobs: {e}")
-
-    def _save_jobs(self):
-        """Save jobs state to disk"""
+        self._db_path = str(self._jobs_dir / "jobs.db")
+
+        if self._db_path not in self._initialized:
+            self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection to the job database, in autocommit mode"""
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        """Create the job database, importing the jobs of an older jobs.json"""
+        with self._init_lock:
+            if self._db_path in self._initialized:
+                return
+            self._jobs_dir.mkdir(parents=True, exist_ok=True)
+            with closing(self._connect()) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                self._add_missing_columns(conn)
+                conn.execute(QUEUE_INDEX)
+                self._import_jobs_file(conn)
+            self._initialized.add(self._db_path)
+
+    def _add_missing_columns(self, conn: sqlite3.Connection):
+        """Upgrade a jobs table created before some of its columns"""
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _import_jobs_file(self, conn: sqlite3.Connection):
+        """Move the jobs of the jobs.json file used before the database"""
         jobs_file = self._jobs_dir / "jobs.json"
+        if not jobs_file.exists():
+            return
         try:
-            # Convert int keys to strings for JSON
-            jobs_data = {str(k): v for k, v in self._jobs.items()}
-            data = {"jobs": jobs_data, "next_id": self._next_job_id}
-            with open(jobs_file, "w") as f:
-                json.dump(data, f, indent=2)
+            with open(jobs_file) as f:
+                jobs = json.load(f).get("jobs", {})
+            conn.execute("BEGIN IMMEDIATE")
+            for job_id, job_info in jobs.items():
+                job_info = {
+                    **job_info,
+                    "session": Path(job_info.get("script_path", "")).parent.name,
+                    "attempts": 0,
+                    "priority": PRIORITY_NORMAL,
+                    "size": 0,
+                }
+                conn.execute(
+                    f"INSERT OR IGNORE INTO jobs (job_id, {', '.join(JOB_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' * len(JOB_COLUMNS))})",
+                    [int(job_id)] + [job_info.get(column) for column in JOB_COLUMNS],
+                )
+            conn.execute("COMMIT")
+            jobs_file.rename(jobs_file.with_suffix(".json.imported"))
+            self.logger.info(f"Imported {len(jobs)} jobs from {jobs_file}")
         except Exception as e:
-            self.logger.error(f"Could not save jobs state: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            self.logger.warning(f"Could not import existing jobs: {e}")
 
-    def _get_next_job_id(self) -> int:
-        """Get the next available job ID"""
-        with self._lock:
-            job_id = self._next_job_id
-            self._next_job_id += 1
-            return job_id
+    def _update_job(
+        self, job_id: int, from_statuses: tuple[str, ...] | None = None, **fields
+    ) -> bool:
+        """
+        Update the fields of a job in a single statement.
 
-    def _run_script_in_background(
-        self, job_id: int, script_path: str, script_options: str = ""
-    ):
-        """Run the script in a background thread"""
-        try:
-            # Update job status to running
-            with self._lock:
-                if job_id in self._jobs:
-                    self._jobs[job_id].update(
-                        {"status": "RUNNING", "start_time": datetime.now().isoformat()}
-                    )
-                    self._save_jobs()
-
-            # Prepare command
-            cmd = [sys.executable, script_path]
-            if script_options:
-                cmd = [sys.executable, script_path, script_options]
-
-            # Create log files
-            job_info = self._jobs[job_id]
-            log_dir = Path(job_info["log_dir"])
-            log_dir.mkdir(parents=True, exist_ok=True)
-
-            stdout_file = log_dir / f"{job_info['name']}.out"
-            stderr_file = log_dir / f"{job_info['name']}.err"
-
-            # Run the process
-            start_time = time.time()
-            with open(stdout_file, "w") as stdout_f, open(stderr_file, "w") as stderr_f:
-                process = subprocess.run(
-                    cmd,
-                    stdout=stdout_f,
-                    stderr=stderr_f,
-                    text=True,
-                    cwd=os.path.dirname(script_path),
-                )
+        Args:
+            job_id: The ID of the job
+            from_statuses: If given, the job is only updated while in one of them,
+                so that concurrent status transitions cannot overwrite each other
+            **fields: Columns to set
 
-            end_time = time.time()
-            elapsed = end_time - start_time
-
-            # Update job status based on result
-            with self._lock:
-                if job_id in self._jobs:
-                    status = "COMPLETED" if process.returncode == 0 else "FAILED"
-                    self._jobs[job_id].update(
-                        {
-                            "status": status,
-                            "return_code": process.returncode,
-                            "elapsed": f"{int(elapsed // 60):02d}:{int(elapsed % 60):02d}",
-                            "end_time": datetime.now().isoformat(),
-                            "stdout_file": str(stdout_file),
-                            "stderr_file": str(stderr_file),
-                        }
-                    )
-                    self._save_jobs()
+        Returns:
+            True if the job was updated
+        """
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        query = f"UPDATE jobs SET {assignments} WHERE job_id = ?"
+        params = [*fields.values(), job_id]
+        if from_statuses:
+            query += f" AND status IN ({', '.join('?' * len(from_statuses))})"
+            params += from_statuses
+        with closing(self._connect()) as conn:
+            return conn.execute(query, params).rowcount > 0
 
-            self.logger.info(f"Job {job_id} completed with status: {status}")
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict[str, Any]:
+        """Job information of a row, without the fields not set yet"""
+        return {key: row[key] for key in row.keys() if row[key] is not None}
 
-        except Exception as e:
-            # Update job status to failed
-            with self._lock:
-                if job_id in self._jobs:
-                    self._jobs[job_id].update(
-                        {
-                            "status": "FAILED",
-                            "error": str(e),
-                            "end_time": datetime.now().isoformat(),
-                        }
+    def claim_next_job(
+        self, limits: dict[str, int] | None = None
+    ) -> dict[str, Any] | None:
+        """
+        Move the next pending job to RUNNING, for the runner to start it.
+        The jobs are taken in the queue order (see QUEUE_ORDER), skipping the types
+        which already have as many jobs running as their limit.
+
+        Args:
+            limits: Optional maximum number of running jobs of each type, 0 for
+                no limit. Jobs without a type are never held back.
+
+        Returns:
+            Dictionary with job information, or None if no job can be started
+        """
+        with closing(self._connect()) as conn:
+            # The write lock is taken first, so two runners cannot claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = dict(
+                    conn.execute(
+                        "SELECT job_type, COUNT(*) FROM jobs WHERE status = 'RUNNING' "
+                        "GROUP BY job_type"
+                    ).fetchall()
+                )
+                full = [
+                    job_type
+                    for job_type, limit in (limits or {}).items()
+                    if limit > 0 and running.get(job_type, 0) >= limit
+                ]
+                placeholders = ", ".join("?" * len(full))
+                row = conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = 'PENDING' "
+                    f"AND (job_type IS NULL OR job_type NOT IN ({placeholders})) "
+                    f"ORDER BY {QUEUE_ORDER} LIMIT 1",
+                    full,
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'RUNNING', start_time = ?, "
+                        "attempts = attempts + 1 WHERE job_id = ?",
+                        (datetime.now().isoformat(), row["job_id"]),
                     )
-                    self._save_jobs()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get_job_info(row["job_id"]) if row else None
+
+    def get_queue_position(self, job_id: int) -> int | None:
+        """
+        Get the position of a pending job in the queue of its type.
 
-            self.logger.error(f"Job {job_id} failed with error: {e}")
+        Args:
+            job_id: The ID of the job
+
+        Returns:
+            1 for the next job to start, or None if the job is not pending
+        """
+        if job_id is None:
+            return None
+
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT job_type, priority, size FROM jobs "
+                "WHERE job_id = ? AND status = 'PENDING'",
+                (job_id,),
+            ).fetchone()
+            if not row:
+                return None
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'PENDING' AND job_type IS ? "
+                "AND (priority > ? OR (priority = ? AND (size < ? "
+                "OR (size = ? AND job_id < ?))))",
+                (
+                    row["job_type"],
+                    row["priority"],
+                    row["priority"],
+                    row["size"],
+                    row["size"],
+                    job_id,
+                ),
+            ).fetchone()[0]
+        return ahead + 1
+
+    def set_job_process(self, job_id: int, pid: int) -> bool:
+        """Record the process running a job, so that a new runner can adopt it"""
+        return self._update_job(job_id, ("RUNNING",), pid=pid)
+
+    def finish_job(
+        self, job_id: int, return_code: int | None, error: str | None = None
+    ) -> bool:
+        """
+        Mark a running job as completed or failed.
+
+        Args:
+            job_id: The ID of the job
+            return_code: Exit code of the script, None if unknown
+            error: Optional reason of the failure
+
+        Returns:
+            True if the job was running
+        """
+        job_info = self.get_job_info(job_id)
+        if not job_info:
+            return False
+
+        elapsed = 0.0
+        if "start_time" in job_info:
+            start_time = datetime.fromisoformat(job_info["start_time"])
+            elapsed = (datetime.now() - start_time).total_seconds()
+        status = "COMPLETED" if return_code == 0 else "FAILED"
+        log_dir = Path(job_info["log_dir"])
+
+        updated = self._update_job(
+            job_id,
+            ("RUNNING",),
+            status=status,
+            return_code=return_code,
+            error=error,
+            elapsed=f"{int(elapsed // 60):02d}:{int(elapsed % 60):02d}",
+            end_time=datetime.now().isoformat(),
+            stdout_file=str(log_dir / f"{job_info['name']}.out"),
+            stderr_file=str(log_dir / f"{job_info['name']}.err"),
+        )
+        if updated:
+            self.logger.info(f"Job {job_id} completed with status: {status}")
+        return updated
+
+    def requeue_job(self, job_id: int) -> bool:
+        """Put a running job whose process was lost back in the queue"""
+        return self._update_job(
+            job_id, ("RUNNING",), status="PENDING", start_time=None, pid=None
+        )
 
     def launch_script(
-        self, script_path: str, job_name: str, script_options: str = ""
+        self,
+        script_path: str,
+        job_name: str,
+        script_options: str = "",
+        job_type: str | None = None,
+        priority: int = PRIORITY_NORMAL,
+        size: int = 0,
     ) -> dict[str, Any]:
         """
-        Launch a script as a background job.
+        Launch a script as a background job, queued until the jobs-worker process
+        starts it.
 
         Args:
             script_path: str
                 Path to the script to execute
             script_options: str
                 Options to pass to the script
+            job_type: str
+                Optional type of the job (see JOB_TYPES), limiting how many run
+            priority: int
+                Jobs with a higher priority are started first
+            size: int
+                Bytes processed by the job, smaller jobs are started first
 
         Returns:
             Dictionary with job information
@@ -160,32 +371,28 @@ class JobService:
             }
 
         try:
-            # Generate job ID and name
-            job_id = self._get_next_job_id()
-
             # Set up log directory (in the same directory as the script)
             log_dir = Path(script_path).parent / "jobs"
 
-            # Store job information
-            with self._lock:
-                self._jobs[job_id] = {
-                    "job_id": job_id,
-                    "name": job_name,
-                    "script_path": script_path,
-                    "script_options": script_options,
-                    "status": "PENDING",
-                    "submit_time": datetime.now().isoformat(),
-                    "log_dir": str(log_dir),
-                }
-                self._save_jobs()
-
-            # Start the job in a background thread
-            thread = threading.Thread(
-                target=self._run_script_in_background,
-                args=(job_id, script_path, script_options),
-                daemon=True,
-            )
-            thread.start()
+            # Store job information, the database generates the job ID
+            with closing(self._connect()) as conn:
+                job_id = conn.execute(
+                    "INSERT INTO jobs (name, session, script_path, script_options, "
+                    "status, submit_time, log_dir, job_type, priority, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_name,
+                        Path(script_path).parent.name,
+                        script_path,
+                        script_options,
+                        "PENDING",
+                        datetime.now().isoformat(),
+                        str(log_dir),
+                        job_type,
+                        priority,
+                        size,
+                    ),
+                ).lastrowid
 
             return {
                 "success": True,
@@ -213,12 +420,40 @@ class JobService:
         if job_id is None:
             return None
 
-        with self._lock:
-            job_info = self._jobs.get(job_id)
-            if job_info:
-                # Return a copy to avoid external modifications
-                return job_info.copy()
-            return None
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def get_jobs(
+        self, status: str | None = None, session: str | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Get the jobs with a status and/or of a session, oldest first.
+
+        Args:
+            status: Optional status of the jobs (PENDING, RUNNING, ...)
+            session: Optional name of the session folder of the jobs
+
+        Returns:
+            List of dictionaries with job information
+        """
+        conditions = []
+        params = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if session is not None:
+            conditions.append("session = ?")
+            params.append(session)
+        query = "SELECT * FROM jobs"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"{query} ORDER BY job_id", params).fetchall()
+        return [self._row_to_job(row) for row in rows]
 
     def delete_job(self, job_id: int) -> bool:
         """
@@ -231,57 +466,38 @@ class JobService:
             True if job was found and cancelled, False otherwise
         """
         try:
-            with self._lock:
-                if job_id in self._jobs:
-                    job_info = self._jobs[job_id]
-                    if job_info["status"] in ["PENDING", "RUNNING"]:
-                        # For running jobs, we can't easily kill them in this simple implementation
-                        # Just mark as cancelled
-                        job_info.update(
-                            {
-                                "status": "CANCELLED",
-                                "end_time": datetime.now().isoformat(),
-                            }
-                        )
-                        self._save_jobs()
-                        self.logger.info(f"Job {job_id} marked as cancelled")
-                    return True
-                return False
+            # Just mark as cancelled, the jobs-worker stops the process of a running job
+            if self._update_job(
+                job_id,
+                ACTIVE_STATUSES,
+                status="CANCELLED",
+                end_time=datetime.now().isoformat(),
+            ):
+                self.logger.info(f"Job {job_id} marked as cancelled")
+                return True
+            return self.get_job_info(job_id) is not None
         except Exception as e:
             self.logger.error(f"Error cancelling job {job_id}: {e}")
             return False
 
     def get_all_jobs(self) -> dict[int, dict[str, Any]]:
         """Get information about all jobs"""
-        with self._lock:
-            return {k: v.copy() for k, v in self._jobs.items()}
+        return {job["job_id"]: job for job in self.get_jobs()}
 
     def cleanup_old_jobs(self, days: int = 30):
         """Remove job records older than specified days"""
-        cutoff_time = datetime.now().timestamp() - (days * 24 * 60 * 60)
-
-        with self._lock:
-            jobs_to_remove = []
-            for job_id, job_info in self._jobs.items():
-                try:
-                    submit_time = datetime.fromisoformat(
-                        job_info["submit_time"]
-                    ).timestamp()
-                    if submit_time < cutoff_time and job_info["status"] in [
-                        "COMPLETED",
-                        "FAILED",
-                        "CANCELLED",
-                    ]:
-                        jobs_to_remove.append(job_id)
-                except Exception:
-                    continue
-
-            for job_id in jobs_to_remove:
-                del self._jobs[job_id]
-
-            if jobs_to_remove:
-                self._save_jobs()
-                self.logger.info(f"Cleaned up {len(jobs_to_remove)} old job records")
+        cutoff_time = datetime.fromtimestamp(
+            datetime.now().timestamp() - (days * 24 * 60 * 60)
+        ).isoformat()
+
+        with closing(self._connect()) as conn:
+            removed = conn.execute(
+                "DELETE FROM jobs WHERE submit_time < ? AND status IN (?, ?, ?)",
+                (cutoff_time, "COMPLETED", "FAILED", "CANCELLED"),
+            ).rowcount
+
+        if removed:
+            self.logger.info(f"Cleaned up {removed} old job records")
 
     @staticmethod
     def prepare_script(
@@ -1,6 +1,10 @@
+import csv
+import hashlib
+import json
 import logging
 import os
 import tarfile
+import tempfile
 
 from geo_uploader.config import get_config
 from geo_uploader.dto import TarReadInfo
@@ -25,6 +29,8 @@ class FileService:
     ) -> list[TarReadInfo]:
         """
         Extract information about reads contained in a tar file.
+        The members are listed from the tar index (see index_tar), so the archive
+        is only scanned the first time or after it changed.
 
         Args:
             tar_path: Path to the tar file
@@ -38,32 +44,58 @@ class FileService:
             FileNotFoundError: If the tar file does not exist
             tarfile.ReadError: If the tar file is corrupted
         """
-        if not os.path.exists(tar_path):
-            self.logger.error(f"The file '{tar_path}' does not exist.")
-            raise FileNotFoundError(f"The file '{tar_path}' does not exist.")
+        index = self.index_tar(tar_path)
 
         reads = []
+        # Sort members to ensure consistent ordering
+        for member in sorted(index["members"], key=lambda m: m["name"]):
+            # Skip empty files
+            if member["size"] == 0:
+                continue
+
+            read = TarReadInfo(
+                name=os.path.basename(member["name"]),
+                size=member["size"],
+                prefix=prefix,
+            )
+            reads.append(read)
 
-        try:
-            with tarfile.open(tar_path) as tar:
-                # Sort members to ensure consistent ordering
-                members = sorted(tar.getmembers(), key=lambda m: m.name)
+        self.logger.debug(f"Extracted {len(reads)} reads from '{tar_path}'")
+        return reads
 
-                for member in members:
-                    # Skip empty files and directories
-                    if member.size == 0 or member.isdir():
-                        continue
+    def index_tar(self, tar_path: str) -> dict:
+        """
+        Get the member index of a tar file: name, size, data offset and mtime of
+        its regular files. The index is cached as a sidecar in CACHE_FOLDER,
+        valid as long as the size and mtime of the tar are unchanged.
 
-                    read_filename = os.path.basename(member.name)
+        Args:
+            tar_path: Path to the tar file
+
+        Returns:
+            dict: The index, with the tar size and mtime, whether it is compressed
+                  and its "members" in the order of the archive
 
-                    read = TarReadInfo(
-                        name=read_filename, size=member.size, prefix=prefix
-                    )
-                    reads.append(read)
+        Raises:
+            FileNotFoundError: If the tar file does not exist
+            tarfile.ReadError: If the tar file is corrupted
+        """
+        if not os.path.exists(tar_path):
+            self.logger.error(f"The file '{tar_path}' does not exist.")
+            raise FileNotFoundError(f"The file '{tar_path}' does not exist.")
 
-            self.logger.debug(f"Extracted {len(reads)} reads from '{tar_path}'")
-            return reads
+        stat = os.stat(tar_path)
+        index_path = self._get_tar_index_path(tar_path)
+        index = self._read_tar_index(index_path)
+        if (
+            index
+            and index.get("size") == stat.st_size
+            and index.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            return index
 
+        try:
+            compressed, members = self._scan_tar(tar_path)
         except tarfile.ReadError as e:
             self.logger.error(f"Failed to read tar file '{tar_path}': {e!s}")
             raise tarfile.ReadError(f"Failed to read tar file '{tar_path}': {e!s}")
@@ -71,6 +103,68 @@ class FileService:
             self.logger.error(f"Unexpected error reading tar file '{tar_path}': {e!s}")
             raise
 
+        index = {
+            "tar_path": os.path.realpath(tar_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "compressed": compressed,
+            "members": members,
+        }
+        self._write_tar_index(index_path, index)
+        self.logger.info(f"Indexed {len(members)} members of '{tar_path}'")
+        return index
+
+    def _scan_tar(self, tar_path: str) -> tuple[bool, list[dict]]:
+        """Read the headers of a tar, seeking over the data of its members if it is
+        uncompressed, else decompressing it in a single pass."""
+        try:
+            tar = tarfile.open(tar_path, "r:")
+            compressed = False
+        except tarfile.ReadError:
+            tar = tarfile.open(tar_path, "r|*")
+            compressed = True
+
+        with tar:
+            members = [
+                {
+                    "name": member.name,
+                    "size": member.size,
+                    "offset": member.offset_data,
+                    "mtime": member.mtime,
+                }
+                for member in tar
+                if member.isfile()
+            ]
+        return compressed, members
+
+    def _get_tar_index_path(self, tar_path: str) -> str:
+        """Sidecar file of the index of a tar, named after its real path."""
+        key = hashlib.sha1(os.path.realpath(tar_path).encode()).hexdigest()
+        return os.path.join(self.config.CACHE_FOLDER, "tar_index", f"{key}.json")
+
+    def _read_tar_index(self, index_path: str) -> dict | None:
+        try:
+            with open(index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable tar index '{index_path}': {e!s}")
+            return None
+
+    def _write_tar_index(self, index_path: str, index: dict) -> None:
+        # Written to a temporary file then renamed, so readers never see a partial index
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(index_path), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write tar index '{index_path}': {e!s}")
+
     def get_file_size(self, file_path: str, is_full_path=True) -> int:
         """
         Get the size of a file.
@@ -149,6 +243,44 @@ class FileService:
             upload_path = os.path.join(upload_path, specific_file)
         return upload_path
 
+    def read_progress_file(self, progress_path: str) -> dict | None:
+        """
+        Read the progress file published by a running background job.
+
+        Args:
+            progress_path: Path to the JSON progress file
+
+        Returns:
+            dict: The progress, or None if the job has not published any yet
+        """
+        try:
+            with open(progress_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read progress file '{progress_path}': {e!s}")
+            return None
+
+    def read_fastq_stats(self, stats_path: str) -> list[dict] | None:
+        """
+        Read the FASTQ statistics written by the MD5 job next to md5sheet.tsv.
+
+        Args:
+            stats_path: Path to the fastq_stats.tsv file
+
+        Returns:
+            list: One dict per FASTQ file, or None if no statistics were computed
+        """
+        try:
+            with open(stats_path, newline="") as f:
+                return list(csv.DictReader(f, delimiter="\t"))
+        except FileNotFoundError:
+            return None
+        except (OSError, csv.Error) as e:
+            self.logger.warning(f"Could not read FASTQ stats '{stats_path}': {e!s}")
+            return None
+
     def new_session_folder(self, session_folder_path: str) -> None:
         """
         Creates a new session folder structure with necessary subdirectories.
@@ -1,11 +1,12 @@
 import configparser
 import datetime
 import os
+import tarfile
 
 from flask import current_app
 
 from geo_uploader.config import get_config
-from geo_uploader.dto import SampleMetadata, SessionMetadata
+from geo_uploader.dto import SampleMetadata, SessionMetadata, TarInfo
 from geo_uploader.models import UploadSessionModel, Users
 from geo_uploader.services.excel_service import (
     ExcelService,
@@ -13,7 +14,11 @@ from geo_uploader.services.excel_service import (
     resize_samples,
 )
 from geo_uploader.services.external.email_service import EmailService
-from geo_uploader.services.external.job_service import JobService
+from geo_uploader.services.external.job_service import (
+    PRIORITY_NORMAL,
+    PRIORITY_REUPLOAD,
+    JobService,
+)
 from geo_uploader.services.file_service import FileService
 from geo_uploader.services.sample_service import SampleService
 
@@ -159,19 +164,83 @@ class SessionUploadService:
                 "script_path": file_paths["bulk_upload_script"],
                 "python_script": file_paths["python_bulk_upload_script"],
                 "job_name": "bulk_upload",
+                "job_type": "upload",
                 "args": f"-c {file_paths['upload_samples_config']} --notify",
-                "job_id_attr": "upload_job_id",
+                "job_id_attrs": ["upload_job_id"],
             },
             {
                 "name": "Bulk MD5 Calculation",
                 "script_path": file_paths["bulk_md5_script"],
                 "python_script": file_paths["python_bulk_md5_script"],
                 "job_name": "bulk_md5",
+                "job_type": "md5",
                 "args": f"-c {file_paths['upload_samples_config']} -o {file_paths['md5_tsv_output']} --notify",
-                "job_id_attr": "md5_job_id",
+                "job_id_attrs": ["md5_job_id"],
             },
         ]
 
+        # Single pass: the upload job hashes the blocks it sends, every file is read once
+        if self.config.SINGLE_PASS_TRANSFER:
+            jobs = [
+                {
+                    "name": "Bulk Upload and MD5 Calculation",
+                    "script_path": file_paths["bulk_upload_script"],
+                    "python_script": file_paths["python_bulk_upload_script"],
+                    "job_name": "bulk_upload",
+                    "job_type": "upload",
+                    "args": f"-c {file_paths['upload_samples_config']} -o {file_paths['md5_tsv_output']} --notify",
+                    "job_id_attrs": ["upload_job_id", "md5_job_id"],
+                },
+            ]
+
+        self._launch_jobs(file_paths, uploadsession, jobs)
+
+    def resubmit_upload(self, uploadsession: UploadSessionModel) -> None:
+        """Launch the upload job again in sync mode, which only sends the files
+        missing on the server or with a different size
+
+        Args:
+            uploadsession: Upload session model
+
+        Raises:
+            JobSubmissionError: If job submission fails
+        """
+        file_paths = self._get_session_paths(uploadsession.session_title)
+        job = {
+            "name": "Bulk Upload (sync)",
+            "script_path": file_paths["bulk_upload_script"],
+            "python_script": file_paths["python_bulk_upload_script"],
+            "job_name": "bulk_upload",
+            "job_type": "upload",
+            "priority": PRIORITY_REUPLOAD,
+            "args": f"-c {file_paths['upload_samples_config']} --sync --notify",
+            "job_id_attrs": ["upload_job_id"],
+        }
+        if self.config.SINGLE_PASS_TRANSFER:
+            job["args"] += f" -o {file_paths['md5_tsv_output']}"
+            job["job_id_attrs"].append("md5_job_id")
+
+        self._launch_jobs(file_paths, uploadsession, [job])
+
+    def _launch_jobs(
+        self,
+        file_paths: dict[str, str],
+        uploadsession: UploadSessionModel,
+        jobs: list[dict],
+    ) -> None:
+        """Prepare and launch the jobs, saving their ids in the session
+
+        Args:
+            file_paths: Dictionary containing all relevant file paths
+            uploadsession: Upload session model
+            jobs: Job configurations
+
+        Raises:
+            JobSubmissionError: If job submission fails
+        """
+        # Small sessions are started first when jobs are queued
+        session_size = self._get_session_size(file_paths["upload_samples_config"])
+
         # Launch each job and update the database
         for job in jobs:
             # Prepare the script
@@ -184,12 +253,18 @@ class SessionUploadService:
 
             # Launch the script
             result = self.job_service.launch_script(
-                job["script_path"], job["job_name"], job["args"]
+                job["script_path"],
+                job["job_name"],
+                job["args"],
+                job_type=job["job_type"],
+                priority=job.get("priority", PRIORITY_NORMAL),
+                size=session_size,
             )
 
             # Update database or handle error
             if result["success"]:
-                setattr(uploadsession, job["job_id_attr"], result["job_id"])
+                for job_id_attr in job["job_id_attrs"]:
+                    setattr(uploadsession, job_id_attr, result["job_id"])
                 self.logger.info(
                     f"{job['name']} job submitted successfully with ID: {result['job_id']}"
                 )
@@ -204,6 +279,31 @@ class SessionUploadService:
                     self.logger.error(f"Command output: {result['output']}")
                 raise JobSubmissionError(error_msg)
 
+    def _get_session_size(self, upload_samples_config: str) -> int:
+        """Total size of the files listed in upload_samples.ini
+
+        Args:
+            upload_samples_config: Path to the upload_samples.ini file
+
+        Returns:
+            int: Size in bytes, 0 if the file cannot be read
+        """
+        config = configparser.ConfigParser()
+        try:
+            config.read(upload_samples_config)
+        except configparser.Error as e:
+            self.logger.warning(f"Could not read {upload_samples_config}: {e!s}")
+            return 0
+
+        total_size = 0
+        for section in config.sections():
+            if not section.endswith((".processed_files", ".raw_files")):
+                continue
+            for key, value in config[section].items():
+                if key.startswith(("size", "read_file_size")) and value.isdigit():
+                    total_size += int(value)
+        return total_size
+
     def _get_session_paths(self, session_title: str) -> dict[str, str]:
         """Get all paths related to the session
 
@@ -310,6 +410,28 @@ class SessionUploadService:
             "username": self.config.GEO_USERNAME,
             "folder": full_remote_folder,
             "password": session_metadata.remote_password,
+            "connections": str(self.config.FTP_CONNECTIONS),
+            "blocksize": str(self.config.FTP_BLOCKSIZE),
+            "sndbuf": str(self.config.FTP_SNDBUF),
+            "sendfile": str(self.config.FTP_SENDFILE),
+            "readahead": str(self.config.FTP_READAHEAD),
+            "segment_threshold_mb": str(self.config.FTP_SEGMENT_THRESHOLD_MB),
+            "segment_streams": str(self.config.FTP_SEGMENT_STREAMS),
+            "order": self.config.FTP_UPLOAD_ORDER,
+            "bandwidth_limit_mbps": str(self.config.FTP_BANDWIDTH_LIMIT_MBPS),
+            "bandwidth_schedule": self.config.FTP_BANDWIDTH_SCHEDULE,
+            # Running upload jobs divide the bandwidth through this folder
+            "bandwidth_state": os.path.join(self.config.CACHE_FOLDER, "bandwidth"),
+        }
+
+        # Add md5 section, read by the bulk_md5 job
+        config["md5"] = {
+            "workers": str(self.config.MD5_WORKERS),
+            "cache_path": os.path.join(self.config.CACHE_FOLDER, "checksums.db"),
+            "cache_max_age_days": str(self.config.CHECKSUM_CACHE_MAX_AGE_DAYS),
+            "cache_max_entries": str(self.config.CHECKSUM_CACHE_MAX_ENTRIES),
+            "verify_gzip": str(self.config.MD5_VERIFY_GZIP),
+            "fastq_stats": str(self.config.MD5_FASTQ_STATS),
         }
 
         # Process each sample
@@ -328,18 +450,31 @@ class SessionUploadService:
                         processed_file.size
                     )
 
-            self._add_bulk_raw_files_to_config(config, sample, sample_section)
+            if sample.is_single_cell:
+                self._add_single_cell_raw_files_to_config(
+                    config, sample, sample_section
+                )
+            else:
+                self._add_bulk_raw_files_to_config(config, sample, sample_section)
 
         # Write the INI file
         with open(upload_samples_config, "w") as f:
             config.write(f)
 
-    @staticmethod
     def _add_single_cell_raw_files_to_config(
-        config: configparser.ConfigParser, sample: SampleMetadata, sample_section: str
+        self,
+        config: configparser.ConfigParser,
+        sample: SampleMetadata,
+        sample_section: str,
     ) -> None:
         """Adds single-cell specific structure to the config.
 
+        The reads are streamed out of their tar by the upload and MD5 jobs, so
+        output_tar_read is only the name they are uploaded as, nothing is extracted.
+        tar_read_name is the name of the read in the tar, matched exactly.
+        When the tars of the sample were not listed yet, they are listed from its
+        raw files, and the raw files which are not tars are added as they are.
+
         Args:
             config: Config object to modify
             sample: Sample metadata object
@@ -349,11 +484,12 @@ class SessionUploadService:
         config[raw_files] = {}
         sample_counter = 0
 
+        if not sample.tars_info:
+            self._add_tars_info(config, sample, raw_files)
+
         for _tar_idx, tar_info in enumerate(sample.tars_info):
             for tar_read in tar_info.tar_read_infos:
-                output_tar_read = os.path.join(
-                    config["session"]["extraction_folder"], tar_read.name
-                )
+                output_tar_read = f"{tar_read.prefix or ''}{tar_read.name}"
 
                 config[raw_files][f"source_tar_path{sample_counter}"] = (
                     tar_info.tar_path
@@ -362,8 +498,50 @@ class SessionUploadService:
                 config[raw_files][f"read_file_size{sample_counter}"] = str(
                     tar_read.size
                 )
+                config[raw_files][f"tar_read_name{sample_counter}"] = tar_read.name
                 sample_counter += 1
 
+    def _add_tars_info(
+        self,
+        config: configparser.ConfigParser,
+        sample: SampleMetadata,
+        raw_files: str,
+    ) -> None:
+        """Lists the reads of the tars among the raw files of a single-cell sample.
+
+        A read found in several tars of the sample is prefixed with the name of
+        its tar, so the uploaded names do not conflict. The raw files which are
+        not tars are written to the raw files section as path/size entries.
+
+        Args:
+            config: Config object to modify
+            sample: Sample metadata object, its tars_info is filled
+            raw_files: Raw files section of the sample
+        """
+        seen_names: set[str] = set()
+        file_idx = 0
+        for file_info in sample.raw_file_paths:
+            try:
+                reads = self.file_service.extract_reads_from_tar(file_info.path)
+            except (OSError, tarfile.ReadError) as e:
+                self.logger.warning(
+                    f"Raw file {file_info.path} is not a readable tar, "
+                    f"uploading it as is: {e!s}"
+                )
+                config[raw_files][f"path{file_idx}"] = file_info.path
+                config[raw_files][f"size{file_idx}"] = str(file_info.size)
+                file_idx += 1
+                continue
+
+            if seen_names & {read.name for read in reads}:
+                prefix = f"{file_info.file_name.split('.')[0]}_"
+                for read in reads:
+                    read.prefix = prefix
+            seen_names.update(read.name for read in reads)
+            sample.tars_info.append(
+                TarInfo(tar_path=file_info.path, tar_read_infos=reads)
+            )
+
     @staticmethod
     def _add_bulk_raw_files_to_config(
         config: configparser.ConfigParser, sample: SampleMetadata, sample_section: str
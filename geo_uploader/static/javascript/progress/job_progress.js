@@ -0,0 +1,107 @@
+// Polls the status endpoint of a background job and renders its published progress
+const JOB_PROGRESS_POLL_MS = 2000;
+
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    let value = bytes;
+    let unit = 0;
+    while (value >= 1024 && unit < units.length - 1) {
+        value /= 1024;
+        unit++;
+    }
+    return `${value.toFixed(unit === 0 ? 0 : 2)} ${units[unit]}`;
+}
+
+function formatDuration(seconds) {
+    if (seconds === null || seconds === undefined) {
+        return '-';
+    }
+    const hours = Math.floor(seconds / 3600);
+    const minutes = Math.floor((seconds % 3600) / 60);
+    const secs = seconds % 60;
+    return hours > 0 ? `${hours}h ${minutes}m` : `${minutes}m ${secs}s`;
+}
+
+function renderJobProgress(progress) {
+    if (!progress) {
+        return;
+    }
+    const percent = progress.total_bytes ? (progress.bytes_done / progress.total_bytes) * 100 : 0;
+    const bar = document.getElementById('job_progress_bar');
+    bar.style.width = `${percent.toFixed(1)}%`;
+    bar.textContent = `${percent.toFixed(1)}%`;
+    bar.classList.toggle('progress-bar-animated', progress.status === 'RUNNING');
+    bar.classList.toggle('bg-danger', progress.status === 'FAILED');
+
+    document.getElementById('job_progress_bytes').textContent =
+        `${formatBytes(progress.bytes_done)} / ${formatBytes(progress.total_bytes)}`;
+    document.getElementById('job_progress_files').textContent =
+        `${progress.files_done} / ${progress.total_files}`;
+    document.getElementById('job_progress_throughput').textContent =
+        progress.instant_bps === undefined
+            ? `${formatBytes(progress.throughput_bps)}/s`
+            : `${formatBytes(progress.throughput_bps)}/s (now ${formatBytes(progress.instant_bps)}/s)`;
+    document.getElementById('job_progress_eta').textContent =
+        progress.status === 'RUNNING' ? formatDuration(progress.eta_seconds) : '-';
+    document.getElementById('job_progress_current').textContent =
+        (progress.current_files || []).join(', ') || '-';
+
+    const stalled = Boolean(progress.stalled) && progress.status === 'RUNNING';
+    document.getElementById('job_progress_stalled').classList.toggle('d-none', !stalled);
+    document.getElementById('job_progress_idle').textContent = formatDuration(progress.idle_seconds);
+    bar.classList.toggle('bg-warning', stalled);
+
+    renderFileProgress(progress.files || []);
+}
+
+function renderQueuePosition(queuePosition) {
+    // Position of the job in the queue while it waits for other jobs to finish
+    const queued = document.getElementById('job_progress_queued');
+    queued.classList.toggle('d-none', !queuePosition);
+    document.getElementById('job_progress_queue_position').textContent = queuePosition || '-';
+}
+
+function renderFileProgress(files) {
+    // Per file progress, published by the upload jobs
+    const list = document.getElementById('job_progress_file_list');
+    list.replaceChildren(...files.map(file => {
+        const item = document.createElement('li');
+        item.className = 'list-group-item d-flex justify-content-between align-items-center';
+        const percent = file.size ? Math.min(100, (file.bytes_done / file.size) * 100) : 0;
+        const name = document.createElement('span');
+        name.textContent = file.name;
+        const detail = document.createElement('span');
+        detail.className = 'badge badge-secondary badge-pill';
+        detail.textContent = `${percent.toFixed(1)}% - ${formatBytes(file.throughput_bps)}/s`;
+        item.append(name, detail);
+        return item;
+    }));
+}
+
+function initJobProgress(initialProgress) {
+    const container = document.getElementById('job_progress');
+    const statusUrl = container.dataset.statusUrl;
+    renderJobProgress(initialProgress);
+
+    const poll = () => {
+        fetch(statusUrl)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Error ${response.status}: ${response.statusText}`);
+                }
+                return response.json();
+            })
+            .then(responseData => {
+                renderJobProgress(responseData.progress);
+                renderQueuePosition(responseData.queue_position);
+                // Keep polling while the job is queued or running
+                if (responseData.status === 'PENDING' || responseData.status === 'RUNNING') {
+                    setTimeout(poll, JOB_PROGRESS_POLL_MS);
+                }
+            })
+            .catch(error => {
+                console.error('Error fetching job progress:', error);
+            });
+    };
+    setTimeout(poll, JOB_PROGRESS_POLL_MS);
+}
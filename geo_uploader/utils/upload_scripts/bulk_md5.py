@@ -1,13 +1,27 @@
 import argparse
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Import our utility functions
 from .utils import (
+    HASH_STRATEGIES,
+    ChecksumCache,
     ConfigParser,
-    initialize_tsv,
+    FastqStats,
+    Md5SheetWriter,
+    ProgressReporter,
+    check_pairs,
+    compute_md5_row,
+    group_tar_streams,
+    is_fastq_file,
+    is_gzip_file,
+    iter_tar_members,
     notify_server,
+    read_stats_tsv,
+    resolve_tar_members,
     setup_logger,
-    write_to_tsv,
+    write_stats_tsv,
 )
 
 
@@ -38,18 +52,75 @@ def parse_args():
     parser.add_argument(
         "--notify", action="store_true", help="Notify the server when done"
     )
+    parser.add_argument(
+        "--hash-strategy",
+        choices=["auto", *HASH_STRATEGIES],
+        help="How files are read while hashing (overrides [md5] strategy in the INI file)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of files hashed in parallel (overrides [md5] workers in the INI file)",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Path to the checksum cache database (overrides [md5] cache_path in the INI file)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not use the checksum cache"
+    )
+    parser.add_argument(
+        "--progress",
+        help="Path to the progress file (default: md5_progress.json next to the output)",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Discard rows of a previous run instead of resuming from them",
+    )
+    parser.add_argument(
+        "--verify-gzip",
+        action="store_true",
+        help="Also check the integrity of .gz files while hashing (gzip_ok column)",
+    )
+    parser.add_argument(
+        "--fastq-stats",
+        action="store_true",
+        help="Also count the reads of FASTQ files while hashing and check the R1/R2 pairs",
+    )
+    parser.add_argument(
+        "--stats-output",
+        help="Path to the FASTQ stats TSV file (default: fastq_stats.tsv next to the output)",
+    )
     return parser.parse_args()
 
 
 def process_samples(
     config_parser,
-    tsv_file_path,
+    tsv_writer,
     logger,
     raw_only=False,
     processed_only=False,
     sample_filter=None,
+    workers=1,
+    strategy="auto",
+    cache=None,
+    resume=True,
+    progress_path=None,
+    verify_gzip=False,
+    stats_path=None,
 ):
-    """Process all samples and calculate MD5 checksums."""
+    """Process all samples and calculate MD5 checksums.
+    Files are hashed by a pool of `workers` threads (hashlib releases the GIL while
+    hashing), each row is written as soon as its file is hashed.
+    When resuming, files already listed in the TSV file by a previous run are skipped.
+    If progress_path is given, the bytes hashed and the ETA are published there.
+    With verify_gzip, .gz files are decompressed from the same reads to validate them.
+    If stats_path is given, read counts and lengths of FASTQ files are written there
+    and the files of each sample are checked to have the same number of reads.
+    Members of tar archives are hashed in place, those of a compressed tar in a
+    single pass over it."""
     # Get all sample sections
     sample_sections = config_parser.get_sample_sections(sample_filter)
 
@@ -59,29 +130,129 @@ def process_samples(
         )
         return False
 
-    total_files = 0
-    successful_files = 0
-
-    # Process each sample
+    # Gather the files of every sample
+    files = []
     for sample_section in sample_sections:
         sample_id = sample_section.split(".")[1]
         logger.info(f"Processing sample {sample_id}")
 
         # Get all files for this sample
-        files = config_parser.get_sample_files(
-            sample_section, raw_only=raw_only, processed_only=processed_only
+        files.extend(
+            config_parser.get_sample_files(
+                sample_section, raw_only=raw_only, processed_only=processed_only
+            )
         )
 
-        total_files += len(files)
+    # FASTQ stats of a previous run, kept along with its completed rows
+    stats_rows = read_stats_tsv(stats_path, logger) if stats_path and resume else {}
 
-        # Process each file
-        for file_info in files:
-            if write_to_tsv(tsv_file_path, file_info, logger):
-                successful_files += 1
+    def reprocess(row):
+        """Completed rows still missing a requested check are processed again."""
+        if verify_gzip and is_gzip_file(row["path"]) and row["gzip_ok"] == "NA":
+            return True
+        return bool(
+            stats_path and is_fastq_file(row["path"]) and row["path"] not in stats_rows
+        )
+
+    # Open the output TSV file, keeping the completed rows of a previous run
+    try:
+        if resume:
+            pending_files = tsv_writer.start(files, reprocess)
+        else:
+            tsv_writer.start()
+            pending_files = files
+    except OSError as e:
+        logger.error(f"Failed to initialize output file: {e!s}")
+        return False
+
+    total_files = len(files)
+    successful_files = total_files - len(pending_files)
+
+    # Members of uncompressed tars are read from their offset in the tar
+    pending_files = resolve_tar_members(pending_files, logger)
+
+    # Progress is measured against the sizes listed in the INI file
+    progress = None
+    if progress_path:
+        total_bytes = sum(ConfigParser.get_file_size(f) for f in files)
+        progress = ProgressReporter(progress_path, total_bytes, total_files, logger)
+        progress.bytes_done = total_bytes - sum(
+            ConfigParser.get_file_size(f) for f in pending_files
+        )
+        progress.files_done = successful_files
+        progress.write()
+
+    def hash_file(file_info, stream=None):
+        stats = (
+            FastqStats() if stats_path and is_fastq_file(file_info["path"]) else None
+        )
+        try:
+            row = compute_md5_row(
+                file_info, logger, strategy, cache, progress, verify_gzip, stats, stream
+            )
+        except Exception as e:
+            logger.error(f"Error calculating MD5 of {file_info['path']}: {e!s}")
+            return None
+        if row and stats:
+            stats_rows[file_info["path"]] = stats.to_row(file_info)
+        return row
+
+    def process_file(file_info):
+        """Rows of a file, or of the members of a compressed tar read in one pass."""
+        if "tar_members" not in file_info:
+            return [hash_file(file_info)]
+        rows = {}
+        try:
+            for member, stream in iter_tar_members(
+                file_info["path"], file_info["tar_members"]
+            ):
+                rows[member["path"]] = hash_file(member, stream)
+        except Exception as e:
+            logger.error(f"Failed to read tar file {file_info['path']}: {e!s}")
+        for member in file_info["tar_members"]:
+            if member["path"] not in rows:
+                logger.error(f"{member['file_name']} not found in {file_info['path']}")
+        return [rows.get(member["path"]) for member in file_info["tar_members"]]
+
+    corrupt_files = 0
+    logger.info(f"Hashing {len(pending_files)} files with {workers} worker(s)")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(process_file, file_info)
+                for file_info in group_tar_streams(pending_files)
+            ]
+            rows = (row for future in as_completed(futures) for row in future.result())
+            for row in rows:
+                if row and row["gzip_ok"] == "False":
+                    corrupt_files += 1
+                if row and tsv_writer.write_row(row):
+                    successful_files += 1
+    finally:
+        tsv_writer.close()
+        if progress:
+            progress.finish(
+                "COMPLETED" if successful_files == total_files else "FAILED"
+            )
 
     # Log summary
     logger.info(f"Processed {total_files} files, {successful_files} successful")
-    return successful_files > 0
+    if corrupt_files:
+        logger.error(f"{corrupt_files} files failed the gzip integrity check")
+    if stats_path:
+        write_fastq_stats(stats_path, files, stats_rows, logger)
+    if cache:
+        logger.info(f"Checksum cache: {cache.hits} hits, {cache.misses} misses")
+    return successful_files == total_files
+
+
+def write_fastq_stats(stats_path, files, stats_rows, logger):
+    """Check the read counts of the FASTQ files of each sample and write the stats
+    in the sample/file order."""
+    rows = [stats_rows[f["path"]] for f in files if f["path"] in stats_rows]
+    for sample in check_pairs(rows):
+        logger.error(f"FASTQ files of sample {sample} have different read counts")
+    write_stats_tsv(stats_path, rows, logger)
 
 
 def main():
@@ -102,21 +273,56 @@ def main():
         logger.error("Failed to parse configuration file. Exiting.")
         sys.exit(1)
 
-    # Initialize the output TSV file
+    # Output TSV file, written as files complete
     tsv_file_path = args.output.strip()
-    if not initialize_tsv(tsv_file_path, logger):
-        logger.error("Failed to initialize output file. Exiting.")
-        sys.exit(1)
+    tsv_writer = Md5SheetWriter(tsv_file_path, logger)
+    progress_path = args.progress or os.path.join(
+        os.path.dirname(os.path.abspath(tsv_file_path)), "md5_progress.json"
+    )
+
+    # Command line takes precedence over the [md5] section
+    md5_config = config_parser.get_md5_config()
+    workers = args.workers or md5_config["workers"]
+    strategy = args.hash_strategy or md5_config["strategy"]
+    verify_gzip = args.verify_gzip or md5_config["verify_gzip"]
+    stats_path = None
+    if args.fastq_stats or args.stats_output or md5_config["fastq_stats"]:
+        stats_path = args.stats_output or os.path.join(
+            os.path.dirname(os.path.abspath(tsv_file_path)), "fastq_stats.tsv"
+        )
+
+    # Open the checksum cache shared across sessions
+    cache = None
+    cache_path = args.cache or md5_config["cache_path"]
+    if cache_path and not args.no_cache:
+        try:
+            cache = ChecksumCache(cache_path, logger)
+            cache.evict(
+                md5_config["cache_max_age_days"], md5_config["cache_max_entries"]
+            )
+            logger.info(f"Using checksum cache: {cache_path}")
+        except Exception as e:
+            logger.warning(f"Checksum cache unavailable, hashing everything: {e!s}")
+            cache = None
 
     # Process the samples
     success = process_samples(
         config_parser,
-        tsv_file_path,
+        tsv_writer,
         logger,
         raw_only=args.raw_only,
         processed_only=args.processed_only,
         sample_filter=args.sample,
+        workers=max(1, workers),
+        strategy=strategy,
+        cache=cache,
+        resume=not args.restart,
+        progress_path=progress_path,
+        verify_gzip=verify_gzip,
+        stats_path=stats_path,
     )
+    if cache:
+        cache.close()
 
     # Notify the server if requested
     if args.notify and success:
@@ -133,7 +339,7 @@ def main():
             sys.exit(1)
 
     if not success:
-        logger.error("No files were processed successfully")
+        logger.error("Not all files were processed successfully")
         sys.exit(1)
 
     logger.info("=== MD5 calculation completed successfully ===")
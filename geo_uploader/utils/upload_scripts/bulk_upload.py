@@ -1,18 +1,54 @@
 import argparse
 import os
+import queue
 import sys
+import tarfile
+import tempfile
+import threading
+import time
 
 # Import our utility functions
 from .utils import (
+    DEFAULT_BLOCKSIZE,
+    UPLOAD_ORDERS,
+    BandwidthLimiter,
+    ChecksumCache,
     ConfigParser,
+    Md5SheetWriter,
+    ProgressReporter,
+    RemoteDirectoryCache,
+    StreamHasher,
+    TransferJournal,
+    build_md5_row,
     close_ftp,
+    compute_md5_row,
     connect_ftp,
+    ensure_connection,
+    group_tar_streams,
+    is_connection_alive,
+    is_tar_member,
+    iter_tar_members,
+    list_remote_files,
     notify_server,
+    order_files,
+    parse_bandwidth_schedule,
+    predict_connection_loads,
+    probe_blocksize,
+    reconnect_ftp,
+    resolve_tar_members,
     setup_logger,
     upload_file,
+    upload_file_segmented,
+    upload_stream,
     verify_upload,
+    verify_uploads,
 )
 
+# Uploaded files verified together with a single listing of the remote folder
+VERIFY_BATCH_SIZE = 100
+# Seconds an idle connection waits for files put back by a lost connection
+QUEUE_POLL_INTERVAL = 1.0
+
 
 def parse_args():
     """Parse command line arguments."""
@@ -36,20 +72,121 @@ def parse_args():
     parser.add_argument(
         "--notify", action="store_true", help="Notify the server when done"
     )
+    parser.add_argument(
+        "-o",
+        "--md5-output",
+        help="Also calculate MD5 checksums while uploading, into this TSV file",
+    )
+    parser.add_argument(
+        "-n",
+        "--connections",
+        type=int,
+        help="Number of parallel FTP connections (overrides [remote] connections in the INI file)",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Only upload files missing on the server or with a different size",
+    )
+    parser.add_argument(
+        "--journal",
+        help="Path to the transfer journal (default: upload_journal.jsonl next to the INI file)",
+    )
+    parser.add_argument(
+        "--order",
+        choices=UPLOAD_ORDERS,
+        help="Order of the uploads (overrides [remote] order in the INI file, default: largest_first)",
+    )
+    parser.add_argument(
+        "--readahead",
+        type=int,
+        help="Number of blocks read ahead while sending, for slow storage (overrides [remote] readahead in the INI file, 0 to disable)",
+    )
+    parser.add_argument(
+        "--progress",
+        help="Path to the progress file (default: upload_progress.json next to the INI file)",
+    )
     return parser.parse_args()
 
 
+def open_checksum_cache(config_parser, logger):
+    """Open the checksum cache of the [md5] section, if configured."""
+    cache_path = config_parser.get_md5_config()["cache_path"]
+    if not cache_path:
+        return None
+    try:
+        return ChecksumCache(cache_path, logger)
+    except Exception as e:
+        logger.warning(f"Checksum cache unavailable: {e!s}")
+        return None
+
+
+def open_bandwidth_limiter(upload_config, logger):
+    """Open the bandwidth limiter of the [remote] section, if a limit is configured.
+    Jobs share the limit through the bandwidth_state folder (default: a folder in
+    the temporary directory of the machine)."""
+    windows = []
+    if upload_config["bandwidth_schedule"]:
+        try:
+            windows = parse_bandwidth_schedule(upload_config["bandwidth_schedule"])
+        except ValueError as e:
+            logger.error(f"Ignoring the bandwidth schedule: {e!s}")
+    if not upload_config["bandwidth_limit_mbps"] and not any(
+        rate for _, _, rate in windows
+    ):
+        return None
+
+    state_dir = upload_config["bandwidth_state"] or os.path.join(
+        tempfile.gettempdir(), "geo_uploader_bandwidth"
+    )
+    try:
+        limiter = BandwidthLimiter(
+            upload_config["bandwidth_limit_mbps"], state_dir, logger, windows
+        )
+    except OSError as e:
+        logger.warning(f"Bandwidth limiter unavailable: {e!s}")
+        return None
+    logger.info(
+        f"Bandwidth shared with the other upload jobs: {upload_config['bandwidth_schedule'] or 'always'}, otherwise {upload_config['bandwidth_limit_mbps'] or 'unlimited'} MB/s"
+    )
+    return limiter
+
+
 def upload_files(
-    config_parser, logger, raw_only=False, processed_only=False, sample_filter=None
+    config_parser,
+    logger,
+    raw_only=False,
+    processed_only=False,
+    sample_filter=None,
+    md5_writer=None,
+    cache=None,
+    connections=None,
+    sync=False,
+    journal=None,
+    progress_path=None,
+    readahead=None,
+    order=None,
 ):
-    """Upload all files to the FTP server based on configuration."""
+    """Upload all files to the FTP server based on configuration.
+    Files are uploaded by `connections` workers (default: [remote] connections in
+    the INI file), each with its own FTP connection, pulling from a shared queue.
+    If md5_writer is given, the files are hashed from the uploaded blocks in the
+    same pass, and the TSV row of each file is written once its upload completes.
+    With sync, files already on the server with the same size are skipped. Completed
+    uploads are recorded in the journal (a TransferJournal) if given. If progress_path
+    is given, the bytes sent, the throughput of each file and stalls are published there.
+    readahead (default: [remote] readahead) blocks are read ahead of the connection.
+    The queue is sorted by the INI sizes according to order (default: [remote] order,
+    see UPLOAD_ORDERS), the predicted and actual completion times are logged.
+    Members of tar archives are streamed from the tar, without extracting them.
+    Returns (all files verified, number of MD5 rows written)."""
     # Get FTP configuration
     ftp_config = config_parser.get_ftp_config()
     if not ftp_config or not all(
         key in ftp_config for key in ["server", "username", "password", "folder"]
     ):
         logger.error("Missing or incomplete FTP configuration")
-        return False
+        return False, 0
 
     # Get all sample sections
     sample_sections = config_parser.get_sample_sections(sample_filter)
@@ -58,63 +195,576 @@ def upload_files(
         logger.warning(
             f"No sample sections found{' for sample ' + sample_filter if sample_filter else ''}"
         )
-        return False
+        return False, 0
 
-    # Connect to FTP server
-    ftp = connect_ftp(ftp_config, logger)
-    if not ftp:
-        logger.error("Failed to connect to FTP server. Exiting.")
-        return False
+    # Gather the files of every sample
+    files = []
+    for sample_section in sample_sections:
+        sample_id = sample_section.split(".")[1]
+        logger.info(f"Processing sample {sample_id}")
 
-    total_files = 0
-    uploaded_files = 0
-    verified_files = 0
+        # Get all files for this sample
+        files.extend(
+            config_parser.get_sample_files(
+                sample_section, raw_only=raw_only, processed_only=processed_only
+            )
+        )
 
-    try:
-        # Process each sample
-        for sample_section in sample_sections:
-            sample_id = sample_section.split(".")[1]
-            logger.info(f"Processing sample {sample_id}")
+    total_files = len(files)
+    # Members of uncompressed tars are sent from their offset in the tar
+    files = resolve_tar_members(files, logger)
+    counts = {
+        "uploaded": 0,
+        "verified": 0,
+        "hashed": 0,
+        "connected": 0,
+        "round_trips": 0,
+        "bytes_sent": 0,
+        "busy_seconds": 0.0,
+    }
+    counts_lock = threading.Lock()
+    directories = RemoteDirectoryCache()
 
-            # Get all files for this sample
-            files = config_parser.get_sample_files(
-                sample_section, raw_only=raw_only, processed_only=processed_only
+    # Only send the files missing on the server, the others count as verified
+    pending_files = files
+    if sync:
+        ftp = connect_ftp(ftp_config, logger)
+        pending_files, synced_files = plan_sync(
+            ftp, ftp_config, files, journal, logger
+        )
+        if ftp:
+            counts["round_trips"] += ftp.round_trips
+            close_ftp(ftp, logger)
+        counts["verified"] += len(synced_files)
+        if md5_writer:
+            counts["hashed"] += write_synced_md5_rows(
+                synced_files, md5_writer, cache, logger
             )
 
-            total_files += len(files)
+    # Progress is measured against the sizes listed in the INI file
+    upload_config = config_parser.get_upload_config()
+    progress = None
+    if progress_path:
+        total_bytes = sum(ConfigParser.get_file_size(f) for f in files)
+        progress = ProgressReporter(
+            progress_path,
+            total_bytes,
+            total_files,
+            logger,
+            stall_timeout=upload_config["stall_timeout"],
+        )
+        progress.bytes_done = total_bytes - sum(
+            ConfigParser.get_file_size(f) for f in pending_files
+        )
+        progress.files_done = total_files - len(pending_files)
+        progress.start_heartbeat()
+
+    # Transfer tuning, the block size is probed on the largest file if set to auto
+    blocksize = upload_config["blocksize"]
+    if blocksize is None:
+        blocksize = tune_blocksize(
+            ftp_config, pending_files, upload_config, directories, counts, logger
+        )
+    sndbuf = upload_config["sndbuf"]
+    logger.info(
+        f"Transfer tuning: block size {blocksize // 1024} KB, send buffer {f'{sndbuf // 1024} KB' if sndbuf else 'system default'}"
+    )
+    if readahead is None:
+        readahead = upload_config["readahead"]
+    if readahead:
+        logger.info(f"Reading {readahead} blocks ahead of every connection")
+    elif upload_config["sendfile"] and md5_writer:
+        logger.info("Zero-copy transfers disabled, the files are hashed while uploading")
+    elif upload_config["sendfile"]:
+        logger.info("Using zero-copy transfers (sendfile)")
+    if upload_config["segment_threshold_mb"] and upload_config["segment_streams"] > 1:
+        logger.info(
+            f"Files of {upload_config['segment_threshold_mb']} MB or more are sent in {upload_config['segment_streams']} concurrent ranges"
+        )
+    transfer = {
+        "blocksize": blocksize,
+        "sendfile": upload_config["sendfile"],
+        "readahead": readahead,
+        "segment_threshold": upload_config["segment_threshold_mb"] * 1024 * 1024,
+        "segment_streams": upload_config["segment_streams"],
+        # Cleared once the server refuses writes at an offset
+        "segmented": True,
+        "limiter": open_bandwidth_limiter(upload_config, logger),
+    }
+    effective_sndbufs = set()
 
-            # Upload each file
-            for file_info in files:
-                local_path = file_info["path"]
-                file_size = file_info["size"]
+    connections = connections or upload_config["connections"]
+    # The members of a compressed tar are sent in order by a single connection
+    queued_files = group_tar_streams(pending_files)
+    connections = min(connections, len(queued_files))
 
-                # Skip if file doesn't exist
-                if not os.path.exists(local_path):
-                    logger.error(f"Local file not found: {local_path}")
-                    continue
+    # Schedule: with the largest files first, no huge file is left to run alone at the end
+    order = order or upload_config["order"]
+    if order not in UPLOAD_ORDERS:
+        logger.warning(f"Unknown upload order {order}, using largest_first")
+        order = "largest_first"
+    queued_files = order_files(queued_files, order)
+    loads = predict_connection_loads(queued_files, connections)
+    if pending_files:
+        logger.info(
+            f"Upload order: {order}, busiest connection {loads[0] / 1024 / 1024:.1f} MB, average {sum(loads) / len(loads) / 1024 / 1024:.1f} MB"
+        )
+    if pending_files and upload_config["expected_mbps"]:
+        logger.info(
+            f"Predicted completion in {format_duration(loads[0] / (upload_config['expected_mbps'] * 1024 * 1024))} at {upload_config['expected_mbps']} MB/s per connection"
+        )
+
+    file_queue = queue.Queue()
+    for file_info in queued_files:
+        file_queue.put(file_info)
+    # Uploaded files left unverified by connections which were lost
+    unverified = []
+
+    def upload_worker():
+        # Each worker owns its connection, ftplib objects are not thread safe
+        ftp = connect_ftp(ftp_config, logger)
+        if not ftp:
+            return
+        ftp.sndbuf = upload_config["sndbuf"]
+        with counts_lock:
+            counts["connected"] += 1
+
+        # Uploaded files waiting for verification
+        batch = []
+        start_time = time.monotonic()
+        try:
+            while True:
+                with counts_lock:
+                    batch.extend(unverified)
+                    unverified.clear()
+                try:
+                    file_info = file_queue.get(timeout=QUEUE_POLL_INTERVAL)
+                except queue.Empty:
+                    # Wait for the files in flight, which a lost connection puts back
+                    if file_queue.unfinished_tasks:
+                        continue
+                    break
+
+                try:
+                    if "tar_members" in file_info:
+                        uploaded_files, hashed = upload_tar_stream(
+                            ftp,
+                            ftp_config,
+                            file_info,
+                            logger,
+                            md5_writer,
+                            directories,
+                            progress,
+                            transfer,
+                        )
+                    else:
+                        uploaded, hashed = upload_one_file(
+                            ftp,
+                            ftp_config,
+                            file_info,
+                            logger,
+                            md5_writer,
+                            cache,
+                            directories,
+                            progress,
+                            transfer,
+                        )
+                        uploaded_files = [file_info] if uploaded else []
+                    if uploaded_files:
+                        batch.extend(uploaded_files)
+                    elif not is_connection_alive(ftp) and not reconnect_ftp(
+                        ftp, logger
+                    ):
+                        # Leave the file and the batch to the connections still
+                        # working, put back before the task is done so that no
+                        # idle worker stops meanwhile
+                        logger.error("Control connection lost, stopping this connection")
+                        file_queue.put(file_info)
+                        with counts_lock:
+                            unverified.extend(batch)
+                        batch = []
+                        break
+                finally:
+                    file_queue.task_done()
+                with counts_lock:
+                    counts["uploaded"] += len(uploaded_files)
+                    counts["hashed"] += hashed
+                    counts["bytes_sent"] += sum(
+                        ConfigParser.get_file_size(f) for f in uploaded_files
+                    )
+
+                if len(batch) >= VERIFY_BATCH_SIZE and ensure_connection(ftp, logger):
+                    verified = verify_batch(ftp, ftp_config, batch, logger, journal)
+                    with counts_lock:
+                        counts["verified"] += verified
+                    batch = []
+
+            if batch and ensure_connection(ftp, logger):
+                verified = verify_batch(ftp, ftp_config, batch, logger, journal)
+                with counts_lock:
+                    counts["verified"] += verified
+            elif batch:
+                with counts_lock:
+                    unverified.extend(batch)
+        finally:
+            with counts_lock:
+                counts["busy_seconds"] += time.monotonic() - start_time
+                counts["round_trips"] += ftp.round_trips
+                if ftp.effective_sndbuf:
+                    effective_sndbufs.add(ftp.effective_sndbuf)
+            # Close FTP connection
+            close_ftp(ftp, logger)
 
-                # Create remote path
-                file_name = os.path.basename(local_path)
-                # remote_path = os.path.join(ftp_config["folder"], file_name)
-                remote_path = ftp_config["folder"].rstrip("/") + "/" + file_name
+    if connections:
+        logger.info(
+            f"Uploading {len(pending_files)} files over {connections} FTP connection(s)"
+        )
+
+    start_time = time.monotonic()
+    workers = [threading.Thread(target=upload_worker) for _ in range(connections)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if counts["connected"] and (file_queue.unfinished_tasks or unverified):
+        # Every connection was lost with files left, send them over a new one
+        logger.info("Uploading the remaining files over a new connection")
+        upload_worker()
+    elapsed_time = time.monotonic() - start_time
+    if transfer["limiter"]:
+        transfer["limiter"].close()
 
-                # Upload the file
-                if upload_file(ftp, local_path, remote_path, logger):
-                    uploaded_files += 1
+    if progress:
+        progress.finish(
+            "COMPLETED" if counts["verified"] == total_files else "FAILED"
+        )
 
-                    # Verify the upload
-                    if verify_upload(ftp, remote_path, file_size, logger):
-                        verified_files += 1
-    finally:
-        # Close FTP connection
-        close_ftp(ftp, logger)
+    if pending_files and not counts["connected"]:
+        logger.error("Failed to connect to FTP server. Exiting.")
+        return False, 0
 
     # Log summary
     logger.info(f"Total files: {total_files}")
-    logger.info(f"Successfully uploaded: {uploaded_files}")
-    logger.info(f"Verified uploads: {verified_files}")
+    logger.info(f"Successfully uploaded: {counts['uploaded']}")
+    if sync:
+        logger.info(f"Already on the server: {total_files - len(pending_files)}")
+    logger.info(f"Verified uploads: {counts['verified']}")
+    if md5_writer:
+        logger.info(f"MD5 checksums written: {counts['hashed']}")
+    logger.info(
+        f"FTP round trips: {counts['round_trips']} ({counts['round_trips'] / max(total_files, 1):.1f} per file)"
+    )
+    if counts["bytes_sent"] and counts["busy_seconds"]:
+        # The schedule replayed at the throughput the connections actually achieved
+        throughput = counts["bytes_sent"] / counts["busy_seconds"]
+        logger.info(
+            f"Completion time: predicted {format_duration(loads[0] / throughput)} at {throughput / 1024 / 1024:.2f} MB/s per connection, actual {format_duration(elapsed_time)}"
+        )
+    if effective_sndbufs:
+        # As reported by the kernel: Linux doubles the requested size for its
+        # bookkeeping and caps it at net.core.wmem_max
+        logger.info(
+            f"Data connection send buffer granted: {', '.join(f'{size // 1024} KB' for size in sorted(effective_sndbufs))}"
+        )
 
-    return verified_files == total_files
+    return counts["verified"] == total_files, counts["hashed"]
+
+
+def upload_one_file(
+    ftp,
+    ftp_config,
+    file_info,
+    logger,
+    md5_writer=None,
+    cache=None,
+    directories=None,
+    progress=None,
+    transfer=None,
+):
+    """Upload a single file over the given connection, it is verified later in a batch.
+    transfer holds the tuning of upload_files (blocksize, sendfile, readahead, the
+    segmented upload settings and the bandwidth limiter); files over the segment
+    threshold are sent in several concurrent ranges, or as a single stream if the
+    server refuses it.
+    Returns (uploaded, MD5 row written)."""
+    transfer = transfer or {}
+    local_path = file_info["path"]
+    # Members of uncompressed tars are read from the tar
+    source_path = file_info.get("tar_path", local_path)
+
+    # Skip if file doesn't exist
+    if not os.path.exists(source_path):
+        logger.error(f"Local file not found: {source_path}")
+        return False, False
+
+    remote_path = get_remote_path(ftp_config, local_path)
+
+    # Upload the file, hashing the blocks on the way if requested
+    hasher = StreamHasher() if md5_writer else None
+    file_progress = None
+    if progress:
+        file_progress = progress.start_file(
+            file_info["file_name"], ConfigParser.get_file_size(file_info)
+        )
+    blocksize = transfer.get("blocksize", DEFAULT_BLOCKSIZE)
+
+    segmented = None
+    if (
+        transfer.get("segmented")
+        and not is_tar_member(file_info)
+        and transfer["segment_streams"] > 1
+        and transfer["segment_threshold"]
+        and os.path.getsize(local_path) >= transfer["segment_threshold"]
+    ):
+        segmented = upload_file_segmented(
+            ftp,
+            ftp_config,
+            local_path,
+            remote_path,
+            transfer["segment_streams"],
+            logger,
+            blocksize=blocksize,
+            progress=file_progress,
+            directories=directories,
+            limiter=transfer.get("limiter"),
+        )
+        if segmented is None:
+            logger.warning(
+                "The server refuses writes at an offset, uploading large files as a single stream"
+            )
+            transfer["segmented"] = False
+        elif not segmented:
+            logger.info(f"Uploading {file_info['file_name']} as a single stream")
+
+    uploaded = segmented or upload_file(
+        ftp,
+        source_path,
+        remote_path,
+        logger,
+        hasher=hasher,
+        directories=directories,
+        progress=file_progress,
+        blocksize=blocksize,
+        sendfile=transfer.get("sendfile", False),
+        readahead=transfer.get("readahead", 0),
+        limiter=transfer.get("limiter"),
+        data_offset=file_info.get("offset") or 0,
+        length=(
+            ConfigParser.get_file_size(file_info)
+            if is_tar_member(file_info)
+            else None
+        ),
+    )
+    if progress:
+        progress.finish_file(file_info["file_name"])
+    if not uploaded:
+        return False, False
+
+    hashed = False
+    if md5_writer and segmented:
+        # The ranges were sent out of order, the file is hashed on its own
+        row = compute_md5_row(file_info, logger, cache=cache)
+        hashed = bool(row) and md5_writer.write_row(row)
+    elif md5_writer and hasher:
+        md5sum = hasher.hexdigest()
+        row = build_md5_row(file_info, md5sum, hasher.bytes_hashed)
+        hashed = md5_writer.write_row(row)
+        if cache:
+            cache.put(ChecksumCache.file_info_key(file_info), md5sum)
+
+    return True, hashed
+
+
+def upload_tar_stream(
+    ftp,
+    ftp_config,
+    stream_info,
+    logger,
+    md5_writer=None,
+    directories=None,
+    progress=None,
+    transfer=None,
+    max_passes=3,
+):
+    """Upload the members of a compressed tar (an entry of group_tar_streams) over the
+    given connection, decompressing the tar once; members which failed are sent again
+    from a new pass over the tar, up to max_passes.
+    Returns (members uploaded, number of MD5 rows written)."""
+    transfer = transfer or {}
+    tar_path = stream_info["path"]
+    pending = list(stream_info["tar_members"])
+    uploaded_files = []
+    hashed_files = 0
+
+    for tar_pass in range(1, max_passes + 1):
+        if not pending:
+            break
+        if tar_pass > 1:
+            logger.info(
+                f"Reading {os.path.basename(tar_path)} again for {len(pending)} member(s)"
+            )
+        failed = list(pending)
+        try:
+            for file_info, stream in iter_tar_members(
+                tar_path, pending, stream_info["tar_members"]
+            ):
+                hasher = StreamHasher() if md5_writer else None
+                file_progress = None
+                if progress:
+                    file_progress = progress.start_file(
+                        file_info["file_name"], ConfigParser.get_file_size(file_info)
+                    )
+                uploaded = upload_stream(
+                    ftp,
+                    stream,
+                    get_remote_path(ftp_config, file_info["path"]),
+                    logger,
+                    hasher=hasher,
+                    directories=directories,
+                    progress=file_progress,
+                    blocksize=transfer.get("blocksize", DEFAULT_BLOCKSIZE),
+                    limiter=transfer.get("limiter"),
+                )
+                if progress:
+                    progress.finish_file(file_info["file_name"])
+                if not uploaded:
+                    continue
+
+                failed.remove(file_info)
+                uploaded_files.append(file_info)
+                if md5_writer:
+                    row = build_md5_row(
+                        file_info, hasher.hexdigest(), hasher.bytes_hashed
+                    )
+                    hashed_files += md5_writer.write_row(row)
+        except (OSError, tarfile.TarError) as e:
+            logger.error(f"Failed to read tar file {tar_path}: {e!s}")
+        pending = failed
+
+    for file_info in pending:
+        logger.error(f"All upload attempts failed for {file_info['file_name']}")
+    return uploaded_files, hashed_files
+
+
+def tune_blocksize(ftp_config, files, upload_config, directories, counts, logger):
+    """Probe the block size over the first probe_size_mb MB of the largest file,
+    falling back to the default block size if the file is too small or the probe fails.
+    The send buffer is not tuned, the probe runs with the configured sndbuf."""
+    probe_bytes = upload_config["probe_size_mb"] * 1024 * 1024
+    largest_file = max(files, key=ConfigParser.get_file_size, default=None)
+    if not largest_file or ConfigParser.get_file_size(largest_file) < probe_bytes:
+        logger.info("No file large enough to probe the block size, using the default")
+        return DEFAULT_BLOCKSIZE
+
+    ftp = connect_ftp(ftp_config, logger)
+    if not ftp:
+        return DEFAULT_BLOCKSIZE
+    ftp.sndbuf = upload_config["sndbuf"]
+    logger.info(
+        f"Probing block sizes over {upload_config['probe_size_mb']} MB of {largest_file['file_name']}"
+    )
+    blocksize = None
+    if directories.ensure(ftp, ftp_config["folder"], logger):
+        blocksize = probe_blocksize(
+            ftp, largest_file["path"], ftp_config["folder"], probe_bytes, logger
+        )
+    counts["round_trips"] += ftp.round_trips
+    close_ftp(ftp, logger)
+    return blocksize or DEFAULT_BLOCKSIZE
+
+
+def verify_batch(ftp, ftp_config, batch, logger, journal=None):
+    """Verify the sizes of uploaded files with a single listing of the remote folder,
+    falling back to one SIZE per file. Returns the number of files verified."""
+    expected_sizes = {
+        os.path.basename(file_info["path"]): int(file_info["size"])
+        for file_info in batch
+    }
+    verified_names = verify_uploads(ftp, ftp_config["folder"], expected_sizes, logger)
+
+    verified = 0
+    for file_info in batch:
+        local_path = file_info["path"]
+        remote_path = get_remote_path(ftp_config, local_path)
+        if verified_names is None:
+            ok = verify_upload(ftp, remote_path, file_info["size"], logger)
+        else:
+            ok = os.path.basename(local_path) in verified_names
+        if ok:
+            verified += 1
+            # The journal identifies files by their own size and mtime
+            if journal and not is_tar_member(file_info):
+                journal.record(local_path, remote_path)
+    return verified
+
+
+def format_duration(seconds):
+    """Human readable duration, e.g. 1h 02m 03s."""
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m {seconds:02d}s"
+    return f"{minutes}m {seconds:02d}s"
+
+
+def get_remote_path(ftp_config, local_path):
+    """Remote path of a local file, in the [remote] folder."""
+    file_name = os.path.basename(local_path)
+    # remote_path = os.path.join(ftp_config["folder"], file_name)
+    return ftp_config["folder"].rstrip("/") + "/" + file_name
+
+
+def plan_sync(ftp, ftp_config, files, journal, logger):
+    """Split the files into (to upload, already on the server), comparing names and
+    sizes with a single listing of the remote folder. If the folder cannot be
+    listed (or ftp is None), the transfer journal of previous runs is trusted instead."""
+    remote_files = None
+    if ftp:
+        remote_files = list_remote_files(ftp, ftp_config["folder"], logger)
+    if remote_files is None:
+        logger.warning("Remote folder could not be listed, using the transfer journal")
+
+    pending_files = []
+    synced_files = []
+    for file_info in files:
+        local_path = file_info["path"]
+        if remote_files is not None:
+            try:
+                local_size = (
+                    ConfigParser.get_file_size(file_info)
+                    if is_tar_member(file_info)
+                    else os.path.getsize(local_path)
+                )
+            except OSError:
+                pending_files.append(file_info)
+                continue
+            synced = remote_files.get(os.path.basename(local_path)) == local_size
+        else:
+            synced = bool(journal) and journal.is_done(
+                local_path, get_remote_path(ftp_config, local_path)
+            )
+
+        if synced:
+            logger.debug(f"Already on the server: {file_info['file_name']}")
+            synced_files.append(file_info)
+        else:
+            pending_files.append(file_info)
+
+    logger.info(
+        f"Sync: {len(synced_files)} files already on the server, {len(pending_files)} to upload"
+    )
+    return pending_files, synced_files
+
+
+def write_synced_md5_rows(synced_files, md5_writer, cache, logger):
+    """Write the MD5 rows of files which were not uploaded again, from the checksum
+    cache when possible. Returns the number of rows written."""
+    hashed_files = 0
+    for file_info in synced_files:
+        row = compute_md5_row(file_info, logger, cache=cache)
+        if row and md5_writer.write_row(row):
+            hashed_files += 1
+    return hashed_files
 
 
 def main():
@@ -135,21 +785,60 @@ def main():
         logger.error("Failed to parse configuration file. Exiting.")
         sys.exit(1)
 
+    # Initialize the MD5 output TSV file when hashing in the same pass
+    md5_writer = None
+    cache = None
+    if args.md5_output:
+        md5_writer = Md5SheetWriter(args.md5_output.strip(), logger)
+        try:
+            md5_writer.start()
+        except OSError as e:
+            logger.error(f"Failed to initialize MD5 output file: {e!s}. Exiting.")
+            sys.exit(1)
+        cache = open_checksum_cache(config_parser, logger)
+
+    # Journal of the completed uploads, read back by --sync
+    journal_path = args.journal or os.path.join(
+        os.path.dirname(os.path.abspath(args.config)), "upload_journal.jsonl"
+    )
+    journal = TransferJournal(journal_path, logger)
+    progress_path = args.progress or os.path.join(
+        os.path.dirname(os.path.abspath(args.config)), "upload_progress.json"
+    )
+
     # Upload the files
-    success = upload_files(
+    success, hashed_files = upload_files(
         config_parser,
         logger,
         raw_only=args.raw_only,
         processed_only=args.processed_only,
         sample_filter=args.sample,
+        md5_writer=md5_writer,
+        cache=cache,
+        connections=args.connections,
+        sync=args.sync,
+        journal=journal,
+        progress_path=progress_path,
+        readahead=args.readahead,
+        order=args.order,
     )
+    if md5_writer:
+        md5_writer.close()
+    if cache:
+        cache.close()
 
-    # Notify the server if requested
+    # Notify the server if requested, the MD5 sheet is ready with the uploads
+    notify_actions = []
+    if args.notify and md5_writer and hashed_files > 0:
+        notify_actions.append("md5")
     if args.notify and success:
-        logger.info("Notifying server of completion")
+        notify_actions.append("upload")
+
+    for action in notify_actions:
+        logger.info(f"Notifying server of {action} completion")
         notify_config = config_parser.get_server_notification_config()
         if notify_config:
-            if notify_server(notify_config, "upload", logger):
+            if notify_server(notify_config, action, logger):
                 logger.info("Server notification successful")
             else:
                 logger.error("Server notification failed")
@@ -1,29 +1,119 @@
 import sys
 
+from geo_uploader.utils.upload_scripts.utils.bandwidth import (
+    BandwidthLimiter,
+    parse_bandwidth_schedule,
+)
+from geo_uploader.utils.upload_scripts.utils.checksum_cache import ChecksumCache
 from geo_uploader.utils.upload_scripts.utils.config_parser import ConfigParser
+from geo_uploader.utils.upload_scripts.utils.fastq_stats import (
+    STATS_COLUMNS,
+    FastqStats,
+    check_pairs,
+    is_fastq_file,
+    read_stats_tsv,
+    write_stats_tsv,
+)
 from geo_uploader.utils.upload_scripts.utils.ftp import (
+    DEFAULT_BLOCKSIZE,
+    CountingFTP,
+    RemoteDirectoryCache,
     close_ftp,
     connect_ftp,
+    ensure_connection,
+    is_connection_alive,
+    list_remote_files,
+    probe_blocksize,
+    reconnect_ftp,
+    storbinary_sendfile,
     upload_file,
+    upload_file_segmented,
+    upload_stream,
     verify_upload,
+    verify_uploads,
+)
+from geo_uploader.utils.upload_scripts.utils.gzip_check import (
+    GzipVerifier,
+    is_gzip_file,
 )
 from geo_uploader.utils.upload_scripts.utils.logger import setup_logger
 from geo_uploader.utils.upload_scripts.utils.md5 import (
+    HASH_STRATEGIES,
+    Md5SheetWriter,
+    StreamHasher,
+    build_md5_row,
     calculate_md5,
+    calculate_md5_member,
+    compute_md5_row,
     initialize_tsv,
     write_to_tsv,
 )
 from geo_uploader.utils.upload_scripts.utils.notify_server import notify_server
+from geo_uploader.utils.upload_scripts.utils.progress import ProgressReporter
+from geo_uploader.utils.upload_scripts.utils.readahead import ReadAheadFile
+from geo_uploader.utils.upload_scripts.utils.schedule import (
+    UPLOAD_ORDERS,
+    order_files,
+    predict_connection_loads,
+)
+from geo_uploader.utils.upload_scripts.utils.tar_members import (
+    group_tar_streams,
+    is_tar_member,
+    iter_tar_members,
+    locate_tar_members,
+    resolve_tar_members,
+)
+from geo_uploader.utils.upload_scripts.utils.transfer_journal import TransferJournal
 
 __all__ = [
+    "DEFAULT_BLOCKSIZE",
+    "HASH_STRATEGIES",
+    "STATS_COLUMNS",
+    "UPLOAD_ORDERS",
+    "BandwidthLimiter",
+    "ChecksumCache",
     "ConfigParser",
+    "CountingFTP",
+    "FastqStats",
+    "GzipVerifier",
+    "Md5SheetWriter",
+    "ProgressReporter",
+    "ReadAheadFile",
+    "RemoteDirectoryCache",
+    "StreamHasher",
+    "TransferJournal",
+    "build_md5_row",
     "calculate_md5",
+    "calculate_md5_member",
+    "check_pairs",
     "close_ftp",
+    "compute_md5_row",
     "connect_ftp",
+    "ensure_connection",
+    "group_tar_streams",
     "initialize_tsv",
+    "is_connection_alive",
+    "is_fastq_file",
+    "is_gzip_file",
+    "is_tar_member",
+    "iter_tar_members",
+    "list_remote_files",
+    "locate_tar_members",
     "notify_server",
+    "order_files",
+    "parse_bandwidth_schedule",
+    "predict_connection_loads",
+    "probe_blocksize",
+    "read_stats_tsv",
+    "reconnect_ftp",
+    "resolve_tar_members",
     "setup_logger",
+    "storbinary_sendfile",
     "upload_file",
+    "upload_file_segmented",
+    "upload_stream",
     "verify_upload",
+    "verify_uploads",
+    "write_stats_tsv",
     "write_to_tsv",
 ]
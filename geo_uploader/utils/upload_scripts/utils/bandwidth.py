@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+# Seconds between two refreshes of the lease and of the share of this job
+LEASE_REFRESH = 2.0
+# Leases not refreshed for this long belong to jobs which stopped sending
+LEASE_TIMEOUT = 10.0
+# Leases left behind by jobs which did not exit cleanly are removed after this long
+LEASE_EXPIRY = 3600.0
+
+
+def parse_bandwidth_schedule(schedule: str) -> list[tuple[int, int, float]]:
+    """Parse a time-of-day profile such as "08:00-18:00=50, 18:00-20:00=100" into
+    (start minute, end minute, MB/s) windows, 0 MB/s meaning unlimited. A window may
+    span midnight (e.g. 22:00-06:00). Raises ValueError on a malformed profile."""
+    windows = []
+    for entry in schedule.replace(";", ",").split(","):
+        if not entry.strip():
+            continue
+        span, _, rate = entry.partition("=")
+        start, _, end = span.partition("-")
+        try:
+            windows.append((_parse_minute(start), _parse_minute(end), float(rate)))
+        except ValueError:
+            raise ValueError(f"Invalid bandwidth window: {entry.strip()}") from None
+    return windows
+
+
+def _parse_minute(clock: str) -> int:
+    hours, _, minutes = clock.strip().partition(":")
+    minute = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= minute <= 24 * 60:
+        raise ValueError(clock)
+    return minute
+
+
+class BandwidthLimiter:
+    """Token bucket capping the upload rate of a job to its share of a bandwidth
+    limit common to all the upload jobs of the server.
+
+    Jobs sending data hold a lease file in state_dir, refreshed every LEASE_REFRESH
+    seconds, and the limit in effect (from the time-of-day windows, else limit_mbps)
+    is divided equally between the jobs with a fresh lease. A job which stops
+    sending lets its lease expire, so the others take over its share. consume() is
+    called with every block sent by any connection of the job: it costs a lock and a
+    clock read, and sleeps while the job is ahead of its share.
+    """
+
+    def __init__(
+        self,
+        limit_mbps: float,
+        state_dir: str,
+        logger: logging.Logger,
+        windows: list[tuple[int, int, float]] | None = None,
+        burst: float = 1.0,
+    ):
+        self.limit_mbps = limit_mbps
+        self.state_dir = state_dir
+        self.logger = logger
+        self.windows = windows or []
+        self.burst = burst
+
+        # Bytes per second allowed to this job, 0 while unlimited
+        self.rate = 0.0
+        self.jobs = 1
+        self._tokens = 0.0
+        self._last = time.monotonic()
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        self._lease_path = os.path.join(state_dir, f"{os.getpid()}.lease")
+        os.makedirs(state_dir, exist_ok=True)
+
+    def update(self, block) -> None:
+        """Account for a block sent, can be passed as a storbinary callback."""
+        self.consume(len(block))
+
+    def consume(self, nbytes: int) -> None:
+        """Account for nbytes sent, waiting until the job is back within its share."""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._next_refresh:
+                self._refresh(now)
+            if not self.rate:
+                return
+            self._tokens = min(
+                self.rate * self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= nbytes
+            # Every sender waits for the tokens it borrowed, so the debt is shared
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+    def current_limit_mbps(self, now: datetime | None = None) -> float:
+        """The limit shared by all the jobs at the given time (default: now)."""
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.windows:
+            if start <= minute < end:
+                return rate
+            # The window spans midnight
+            if end < start and (minute >= start or minute < end):
+                return rate
+        return self.limit_mbps
+
+    def close(self) -> None:
+        """Release the share of this job."""
+        try:
+            os.remove(self._lease_path)
+        except OSError:
+            pass
+
+    def _refresh(self, now: float) -> None:
+        self._next_refresh = now + LEASE_REFRESH
+        jobs = 1
+        try:
+            with open(self._lease_path, "a"):
+                os.utime(self._lease_path)
+            wall_time = time.time()
+            with os.scandir(self.state_dir) as entries:
+                for entry in entries:
+                    if entry.path == self._lease_path:
+                        continue
+                    if not entry.name.endswith(".lease"):
+                        continue
+                    age = wall_time - entry.stat().st_mtime
+                    if age < LEASE_TIMEOUT:
+                        jobs += 1
+                    elif age > LEASE_EXPIRY:
+                        os.remove(entry.path)
+        except OSError as e:
+            self.logger.warning(f"Could not update the bandwidth lease: {e!s}")
+
+        limit_mbps = self.current_limit_mbps()
+        rate = limit_mbps * 1024 * 1024 / jobs if limit_mbps > 0 else 0.0
+        if rate != self.rate:
+            if rate:
+                self.logger.info(
+                    f"Bandwidth limit {limit_mbps:g} MB/s shared by {jobs} job(s), {rate / 1024 / 1024:.2f} MB/s for this job"
+                )
+            else:
+                self.logger.info("Bandwidth unlimited")
+            if not self.rate:
+                # Start with an empty bucket instead of a burst
+                self._tokens = 0.0
+                self._last = now
+        self.rate = rate
+        self.jobs = jobs
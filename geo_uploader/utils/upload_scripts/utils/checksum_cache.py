@@ -0,0 +1,130 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class ChecksumCache:
+    """Persistent MD5 cache shared by the jobs of every upload session.
+
+    Entries are keyed by (realpath, device, inode, size, mtime_ns), so a file that
+    was modified, replaced or moved is never served a stale checksum.
+    """
+
+    def __init__(self, cache_path: str, logger: logging.Logger):
+        self.cache_path = cache_path
+        self.logger = logger
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # One connection shared by the hashing threads, serialized by the lock
+        self._connection = sqlite3.connect(
+            cache_path, timeout=30, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checksums (
+                realpath TEXT NOT NULL,
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                md5sum TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (realpath, device, inode, size, mtime_ns)
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_checksums_last_used ON checksums (last_used)"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def file_key(file_path: str) -> tuple[str, int, int, int, int]:
+        """Return the cache key of a file, reading only its metadata."""
+        realpath = os.path.realpath(file_path)
+        stat = os.stat(realpath)
+        return realpath, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def file_info_key(file_info: dict) -> tuple[str, int, int, int, int]:
+        """Return the cache key of a file listed in the INI file, or tar member."""
+        if file_info.get("tar_path"):
+            return ChecksumCache.member_key(
+                file_info["tar_path"], file_info["file_name"], int(file_info["size"])
+            )
+        return ChecksumCache.file_key(file_info["path"])
+
+    @staticmethod
+    def member_key(
+        tar_path: str, member_name: str, size: int
+    ) -> tuple[str, int, int, int, int]:
+        """Return the cache key of a member of a tar, invalidated with the tar."""
+        realpath, device, inode, _, mtime_ns = ChecksumCache.file_key(tar_path)
+        return f"{realpath}/{member_name}", device, inode, size, mtime_ns
+
+    def get(self, key: tuple[str, int, int, int, int]) -> str | None:
+        """Return the cached checksum for the key, or None on a miss."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT md5sum FROM checksums WHERE realpath = ? AND device = ? "
+                "AND inode = ? AND size = ? AND mtime_ns = ?",
+                key,
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._connection.execute(
+                "UPDATE checksums SET last_used = ? WHERE realpath = ? AND device = ? "
+                "AND inode = ? AND size = ? AND mtime_ns = ?",
+                (time.time(), *key),
+            )
+            self._connection.commit()
+            return row[0]
+
+    def put(self, key: tuple[str, int, int, int, int], md5sum: str) -> None:
+        """Store the checksum computed for the key."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checksums "
+                "(realpath, device, inode, size, mtime_ns, md5sum, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, md5sum, time.time()),
+            )
+            self._connection.commit()
+
+    def evict(self, max_age_days: int | None = None, max_entries: int | None = None):
+        """Remove entries unused for max_age_days, then the least recently used
+        entries above max_entries."""
+        with self._lock:
+            removed = 0
+            if max_age_days:
+                cutoff_time = time.time() - max_age_days * 24 * 60 * 60
+                removed += self._connection.execute(
+                    "DELETE FROM checksums WHERE last_used < ?", (cutoff_time,)
+                ).rowcount
+            if max_entries:
+                removed += self._connection.execute(
+                    "DELETE FROM checksums WHERE rowid NOT IN "
+                    "(SELECT rowid FROM checksums ORDER BY last_used DESC LIMIT ?)",
+                    (max_entries,),
+                ).rowcount
+            self._connection.commit()
+
+        if removed:
+            self.logger.info(f"Evicted {removed} entries from the checksum cache")
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._connection.close()
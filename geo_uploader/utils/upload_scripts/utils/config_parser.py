@@ -47,6 +47,132 @@ class ConfigParser:
             self.logger.error(f"Missing FTP configuration: {e!s}")
             return {}
 
+    def get_upload_config(self) -> dict[str, Any]:
+        """Extract upload tuning settings from the optional keys of the [remote] section.
+        Returns {'connections', 'stall_timeout', 'blocksize', 'sndbuf', 'probe_size_mb',
+        'sendfile', 'readahead', 'segment_threshold_mb', 'segment_streams'}, defaulting
+        to a single FTP connection, reporting a transfer as stalled after 120 seconds
+        without progress, 1 MB blocks, a 4 MB socket send buffer and zero-copy transfers
+        without read-ahead buffers. Files are uploaded as a single stream unless a
+        segment_threshold_mb is set, above which they are sent in segment_streams ranges.
+        Also returns 'order' (default largest_first) and 'expected_mbps', the throughput
+        per connection used to predict the completion time (None if unknown).
+        'bandwidth_limit_mbps' (default 0, unlimited) caps the MB/s of all the upload
+        jobs sharing the 'bandwidth_state' folder, 'bandwidth_schedule' overrides it
+        by time of day (see parse_bandwidth_schedule).
+        blocksize is None for `blocksize = auto`, to be probed over the first
+        probe_size_mb MB of the largest file; sndbuf 0 leaves the system default."""
+        upload_config: dict[str, Any] = {
+            "connections": 1,
+            "stall_timeout": 120,
+            "blocksize": 1024 * 1024,
+            "sndbuf": 4 * 1024 * 1024,
+            "probe_size_mb": 256,
+            "sendfile": True,
+            "readahead": 0,
+            "segment_threshold_mb": 0,
+            "segment_streams": 4,
+            "order": "largest_first",
+            "expected_mbps": None,
+            "bandwidth_limit_mbps": 0.0,
+            "bandwidth_schedule": "",
+            "bandwidth_state": None,
+        }
+        if not self.config or not self.config.has_section("remote"):
+            return upload_config
+
+        try:
+            upload_config["connections"] = max(
+                1, self.config.getint("remote", "connections", fallback=1)
+            )
+            upload_config["stall_timeout"] = self.config.getint(
+                "remote", "stall_timeout", fallback=120
+            )
+            blocksize = self.config.get("remote", "blocksize", fallback="")
+            if blocksize.strip().lower() == "auto":
+                upload_config["blocksize"] = None
+            elif blocksize.strip():
+                upload_config["blocksize"] = max(1024, int(blocksize))
+            upload_config["sndbuf"] = max(
+                0, self.config.getint("remote", "sndbuf", fallback=4 * 1024 * 1024)
+            )
+            upload_config["probe_size_mb"] = max(
+                1, self.config.getint("remote", "probe_size_mb", fallback=256)
+            )
+            upload_config["sendfile"] = self.config.getboolean(
+                "remote", "sendfile", fallback=True
+            )
+            upload_config["readahead"] = max(
+                0, self.config.getint("remote", "readahead", fallback=0)
+            )
+            upload_config["segment_threshold_mb"] = max(
+                0, self.config.getint("remote", "segment_threshold_mb", fallback=0)
+            )
+            upload_config["segment_streams"] = max(
+                1, self.config.getint("remote", "segment_streams", fallback=4)
+            )
+            upload_config["order"] = self.config.get(
+                "remote", "order", fallback="largest_first"
+            )
+            upload_config["expected_mbps"] = self.config.getfloat(
+                "remote", "expected_mbps", fallback=None
+            )
+            upload_config["bandwidth_limit_mbps"] = max(
+                0.0, self.config.getfloat("remote", "bandwidth_limit_mbps", fallback=0)
+            )
+            upload_config["bandwidth_schedule"] = self.config.get(
+                "remote", "bandwidth_schedule", fallback=""
+            )
+            upload_config["bandwidth_state"] = (
+                self.config.get("remote", "bandwidth_state", fallback="") or None
+            )
+        except ValueError as e:
+            self.logger.error(f"Invalid upload configuration: {e!s}")
+
+        return upload_config
+
+    def get_md5_config(self) -> dict[str, Any]:
+        """Extract MD5 calculation settings from the optional [md5] section.
+        Returns {'workers', 'strategy', 'cache_path', 'cache_max_age_days', 'cache_max_entries',
+        'verify_gzip', 'fastq_stats'}, defaulting to a single worker, an automatically selected
+        read strategy, no cache and no gzip verification or FASTQ statistics."""
+        md5_config: dict[str, Any] = {
+            "workers": 1,
+            "strategy": "auto",
+            "cache_path": None,
+            "cache_max_age_days": None,
+            "cache_max_entries": None,
+            "verify_gzip": False,
+            "fastq_stats": False,
+        }
+        if not self.config or not self.config.has_section("md5"):
+            return md5_config
+
+        try:
+            md5_config["workers"] = max(
+                1, self.config.getint("md5", "workers", fallback=1)
+            )
+            md5_config["strategy"] = self.config.get("md5", "strategy", fallback="auto")
+            md5_config["cache_path"] = self.config.get(
+                "md5", "cache_path", fallback=None
+            )
+            md5_config["cache_max_age_days"] = self.config.getint(
+                "md5", "cache_max_age_days", fallback=None
+            )
+            md5_config["cache_max_entries"] = self.config.getint(
+                "md5", "cache_max_entries", fallback=None
+            )
+            md5_config["verify_gzip"] = self.config.getboolean(
+                "md5", "verify_gzip", fallback=False
+            )
+            md5_config["fastq_stats"] = self.config.getboolean(
+                "md5", "fastq_stats", fallback=False
+            )
+        except ValueError as e:
+            self.logger.error(f"Invalid MD5 configuration: {e!s}")
+
+        return md5_config
+
     def get_server_notification_config(self) -> dict[str, str]:
         """Extract server notification details."""
         if not self.config:
@@ -88,7 +214,8 @@ class ConfigParser:
     ) -> list[dict[str, Any]]:
         """Get all files for a specific sample based on filters.
         returns [ {'sample': ..., 'path': ..., 'file_name':... 'file_type': ..., 'size': ...}, ... ]
-        Supposed to be ran with no filter on bulk, but with processed_only = True on single cell.
+        The raw files of single cell samples are members of tar archives: their path
+        is the output_tar_read name they are uploaded as, 'tar_path' the tar holding them.
         """
         if not self.config:
             return []
@@ -107,6 +234,9 @@ class ConfigParser:
                             raw_files_section, sample_name, "raw"
                         )
                     )
+                    files.extend(
+                        self._collect_tar_members(raw_files_section, sample_name)
+                    )
 
             # Process processed files if not in raw-only mode
             if not raw_only:
@@ -171,9 +301,38 @@ class ConfigParser:
 
         return files
 
+    def _collect_tar_members(
+        self, section: str, sample_name: str
+    ) -> list[dict[str, Any]]:
+        """Supposed to run on sc(raw_files), listing the tar members to upload
+        Returns {'sample': ..., 'path': ..., 'file_name': ..., 'file_type': ..., 'size': ..., 'tar_path': ..., 'tar_member': ...}
+        """
+        return [
+            {
+                "sample": sample_name,
+                "path": group["output_tar_read"],
+                "file_type": "raw",
+                "file_name": os.path.basename(group["output_tar_read"]),
+                "size": str(group["read_file_size"]),
+                "tar_path": group["source_tar_path"],
+                # Name of the member in the tar, missing from older INI files
+                "tar_member": group.get("tar_read_name"),
+            }
+            for group in self.get_tar_extract_config(section)
+        ]
+
+    @staticmethod
+    def get_file_size(file_info: dict[str, Any]) -> int:
+        """Size of a file as listed in the INI file, 0 if missing or invalid."""
+        try:
+            return int(file_info.get("size", 0))
+        except (TypeError, ValueError):
+            return 0
+
     def get_tar_extract_config(self, section: str) -> list[dict[str, Any]]:
         """Get TAR extraction configuration from a section.
-        Returns [ {'source_tar_path': ..., 'output_tar_read': ..., 'read_file_size': ...}, ...]
+        Returns [ {'source_tar_path': ..., 'output_tar_read': ..., 'read_file_size': ...,
+        'tar_read_name': ...}, ...], tar_read_name being optional
         """
         if not self.config or section not in self.config.sections():
             return []
@@ -197,6 +356,13 @@ class ConfigParser:
                     file_groups[index]["output_tar_read"] = self.config.get(
                         section, option
                     )
+                elif option.startswith("tar_read_name"):
+                    index = option[len("tar_read_name") :]
+                    if index not in file_groups:
+                        file_groups[index] = {}
+                    file_groups[index]["tar_read_name"] = self.config.get(
+                        section, option
+                    )
                 elif option.startswith("read_file_size"):
                     index = option[len("read_file_size") :]
                     if index not in file_groups:
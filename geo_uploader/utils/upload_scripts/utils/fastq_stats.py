@@ -0,0 +1,149 @@
+import csv
+import logging
+import os
+from collections import Counter
+
+STATS_COLUMNS = [
+    "file_name",
+    "sample",
+    "path",
+    "reads",
+    "min_length",
+    "max_length",
+    "mean_length",
+    "length_distribution",
+    "valid",
+    "pair_ok",
+]
+
+
+def is_fastq_file(file_path: str) -> bool:
+    """Whether the file is a FASTQ file (optionally gzip compressed), judging by its name."""
+    return file_path.removesuffix(".gz").endswith((".fastq", ".fq"))
+
+
+class FastqStats:
+    """Read count and read length distribution of a FASTQ stream.
+
+    Fed with the decompressed data in arbitrary chunks. Records are assumed to be
+    four lines (header, sequence, separator, qualities), as produced by sequencers;
+    lines are split and measured by bytes methods, without a per-read Python loop.
+    """
+
+    def __init__(self):
+        self.length_counts: Counter[int] = Counter()
+        self.error: str | None = None
+        self._tail = b""
+        self._line_index = 0
+        self._first_line = True
+
+    def update(self, data) -> None:
+        """Account for the next chunk of the decompressed FASTQ file."""
+        lines = (self._tail + bytes(data)).split(b"\n")
+        # The last element is an incomplete line, completed by the next chunk
+        self._tail = lines.pop()
+        self._count_lines(lines)
+
+    def finish(self, error: str | None = None) -> None:
+        """Account for a last line without trailing newline. error, if given,
+        marks the statistics as unreliable (e.g. a corrupt gzip stream)."""
+        if self._tail:
+            self._count_lines([self._tail])
+            self._tail = b""
+        if error:
+            self.error = error
+        elif self._line_index != 0:
+            self.error = "truncated FASTQ record"
+
+    @property
+    def reads(self) -> int:
+        return sum(self.length_counts.values())
+
+    def to_row(self, file_info: dict) -> dict:
+        """Return the stats TSV row of the file."""
+        lengths = sorted(self.length_counts)
+        reads = self.reads
+        total_length = sum(length * n for length, n in self.length_counts.items())
+        return {
+            "file_name": file_info.get("file_name", ""),
+            "sample": file_info.get("sample", ""),
+            "path": file_info.get("path", ""),
+            "reads": reads,
+            "min_length": lengths[0] if lengths else 0,
+            "max_length": lengths[-1] if lengths else 0,
+            "mean_length": f"{total_length / reads:.1f}" if reads else 0,
+            "length_distribution": ";".join(
+                f"{length}:{self.length_counts[length]}" for length in lengths
+            ),
+            "valid": str(self.error is None),
+            "pair_ok": "NA",
+        }
+
+    def _count_lines(self, lines: list[bytes]) -> None:
+        if self._first_line and lines:
+            self._first_line = False
+            if not lines[0].startswith(b"@"):
+                self.error = "not a FASTQ file"
+
+        # Sequence lines are the second line of every record
+        first_sequence = (1 - self._line_index) % 4
+        self.length_counts.update(
+            map(len, (line.rstrip(b"\r") for line in lines[first_sequence::4]))
+        )
+        self._line_index = (self._line_index + len(lines)) % 4
+
+
+def check_pairs(rows: list[dict]) -> list[str]:
+    """Set pair_ok on the rows of samples with several FASTQ files (R1/R2, index reads),
+    which must all have the same read count. Returns the mismatching samples."""
+    rows_by_sample: dict[str, list[dict]] = {}
+    for row in rows:
+        rows_by_sample.setdefault(row["sample"], []).append(row)
+
+    mismatched_samples = []
+    for sample, sample_rows in rows_by_sample.items():
+        if len(sample_rows) < 2:
+            continue
+        pair_ok = len({int(row["reads"]) for row in sample_rows}) == 1
+        for row in sample_rows:
+            row["pair_ok"] = str(pair_ok)
+        if not pair_ok:
+            mismatched_samples.append(sample)
+    return mismatched_samples
+
+
+def read_stats_tsv(stats_file_path: str, logger: logging.Logger) -> dict[str, dict]:
+    """Return the rows of an existing stats TSV file by path."""
+    if not os.path.isfile(stats_file_path):
+        return {}
+    try:
+        with open(stats_file_path, newline="") as stats_file:
+            reader = csv.DictReader(stats_file, delimiter="\t")
+            return {
+                row["path"]: row
+                for row in reader
+                if all(row.get(column) is not None for column in STATS_COLUMNS)
+            }
+    except (OSError, csv.Error) as e:
+        logger.warning(f"Could not read previous FASTQ stats: {e!s}")
+        return {}
+
+
+def write_stats_tsv(
+    stats_file_path: str, rows: list[dict], logger: logging.Logger
+) -> bool:
+    """Write the stats TSV file atomically."""
+    temp_path = f"{stats_file_path}.tmp"
+    try:
+        with open(temp_path, "w") as stats_file:
+            stats_file.write("\t".join(STATS_COLUMNS) + "\n")
+            for row in rows:
+                stats_file.write(
+                    "\t".join(str(row[column]) for column in STATS_COLUMNS) + "\n"
+                )
+        os.replace(temp_path, stats_file_path)
+        logger.info(f"Wrote FASTQ stats of {len(rows)} files to {stats_file_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error writing FASTQ stats: {e!s}")
+        return False
@@ -1,11 +1,127 @@
+import contextlib
 import ftplib
 import logging
 import os
+import random
+import select
+import socket
+import threading
 import time
+from collections.abc import Callable
+
+from geo_uploader.utils.upload_scripts.utils.bandwidth import BandwidthLimiter
+from geo_uploader.utils.upload_scripts.utils.md5 import StreamHasher
+from geo_uploader.utils.upload_scripts.utils.progress import FileProgress
+from geo_uploader.utils.upload_scripts.utils.readahead import ReadAheadFile
+
+# Seconds to wait for the reply to an interrupted transfer before resuming it
+REPLY_DRAIN_TIMEOUT = 5
+# Block size of the transfers, large blocks mean fewer send calls per GB
+DEFAULT_BLOCKSIZE = 1024 * 1024
+# Block sizes compared by probe_blocksize
+PROBE_BLOCKSIZES = (256 * 1024, 1024 * 1024, 4 * 1024 * 1024)
+# Scratch file written by probe_blocksize, deleted afterwards
+PROBE_REMOTE_NAME = ".geo_uploader_probe"
+# Seconds a control connection may stay idle before it is checked with a NOOP; also
+# the idle time before TCP keepalive probes, so that firewalls and NAT gateways do
+# not drop the control connection during long transfers
+KEEPALIVE_IDLE = 60
+# Connection attempts when a lost control connection is re-established
+RECONNECT_RETRIES = 6
+# Base and maximum delay (seconds) of the jittered exponential backoff between attempts
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 120
+
+
+class CountingFTP(ftplib.FTP):
+    """ftplib.FTP counting the commands sent, i.e. the round trips to the server.
+    If sndbuf is set, the send buffer of every data connection is enlarged to it;
+    effective_sndbuf is the size granted by the kernel (capped by net.core.wmem_max).
+    The control connection has TCP keepalive enabled; config holds the settings it
+    was opened with by connect_ftp, to re-establish it (see reconnect_ftp)."""
+
+    def __init__(self, *args, **kwargs):
+        self.round_trips = 0
+        self.sndbuf: int | None = None
+        self.effective_sndbuf: int | None = None
+        self.config: dict[str, str] | None = None
+        self.last_command = time.monotonic()
+        super().__init__(*args, **kwargs)
+
+    def connect(self, *args, **kwargs):
+        welcome = super().connect(*args, **kwargs)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            self.sock.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE
+            )
+        return welcome
+
+    def putcmd(self, line):
+        self.round_trips += 1
+        self.last_command = time.monotonic()
+        super().putcmd(line)
+
+    def ntransfercmd(self, cmd, rest=None):
+        conn, size = super().ntransfercmd(cmd, rest)
+        if self.sndbuf:
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        self.effective_sndbuf = conn.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        return conn, size
+
+
+class _FileRange:
+    """File-like reader of at most `length` bytes from the current position of a file."""
+
+    def __init__(self, file, length: int):
+        self._file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self._file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer)[: self.remaining]
+        nbytes = self._file.readinto(view)
+        self.remaining -= nbytes
+        return nbytes
+
 
+class _OffsetRejected(Exception):
+    """The server refused a STOR at an offset (REST), before any data was sent."""
 
-def connect_ftp(config: dict[str, str], logger: logging.Logger) -> ftplib.FTP | None:
-    """Establish FTP connection with retry logic.
+
+class RemoteDirectoryCache:
+    """Remote directories known to exist, shared by the connections of a job so the
+    directory tree is only checked (and created) once."""
+
+    def __init__(self):
+        self._directories: set[str] = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, ftp: ftplib.FTP, directory: str, logger: logging.Logger) -> bool:
+        """Ensure the remote directory exists, unless it was already ensured."""
+        with self._lock:
+            if directory in self._directories:
+                return True
+            if not ensure_remote_directory(ftp, directory, logger):
+                return False
+            self._directories.add(directory)
+            return True
+
+
+def connect_ftp(
+    config: dict[str, str],
+    logger: logging.Logger,
+    max_retries: int = 3,
+    ftp: CountingFTP | None = None,
+) -> CountingFTP | None:
+    """Establish FTP connection with retry logic, waiting a jittered exponentially
+    growing delay between attempts. If ftp is given, it is connected again in place.
     config expected to be {'server', 'username', 'password'}"""
     server = config.get("server")
     username = config.get("username")
@@ -15,28 +131,61 @@ def connect_ftp(config: dict[str, str], logger: logging.Logger) -> ftplib.FTP |
         logger.error("Missing FTP configuration parameters")
         return None
 
-    max_retries = 3
-    retry_delay = 5  # seconds
-
     for attempt in range(1, max_retries + 1):
         try:
             logger.info(
                 f"Connecting to FTP server {server} (attempt {attempt}/{max_retries})..."
             )
-            ftp = ftplib.FTP(server)
-            ftp.login(username, password)
+            if ftp is None:
+                connection = CountingFTP(server)
+            else:
+                connection = ftp
+                connection.connect(server)
+            connection.login(username, password)
+            connection.config = config
             logger.info(f"Successfully connected to {server}")
-            return ftp
+            return connection
         except Exception as e:
             logger.error(f"FTP connection attempt {attempt} failed: {e!s}")
             if attempt < max_retries:
-                logger.info(f"Retrying in {retry_delay} seconds...")
+                # Jitter spreads the reconnections of parallel connections
+                retry_delay = min(
+                    RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)
+                ) * random.uniform(0.5, 1.5)
+                logger.info(f"Retrying in {retry_delay:.1f} seconds...")
                 time.sleep(retry_delay)
 
     logger.error("All connection attempts failed.")
     return None
 
 
+def is_connection_alive(ftp: ftplib.FTP) -> bool:
+    """Whether the control connection answers a NOOP."""
+    try:
+        ftp.voidcmd("NOOP")
+        return True
+    except (*ftplib.all_errors, ValueError, AttributeError):
+        return False
+
+
+def reconnect_ftp(ftp: CountingFTP, logger: logging.Logger) -> bool:
+    """Re-establish a lost control connection in place, so that the references to ftp
+    held by the caller stay valid. Returns False if it cannot be re-established."""
+    if not getattr(ftp, "config", None):
+        return False
+    logger.warning(f"Control connection to {ftp.host} lost, reconnecting")
+    ftp.close()
+    return connect_ftp(ftp.config, logger, RECONNECT_RETRIES, ftp) is not None
+
+
+def ensure_connection(ftp: ftplib.FTP, logger: logging.Logger) -> bool:
+    """Check a control connection idle for more than KEEPALIVE_IDLE seconds with a
+    NOOP (keeping it alive), re-establishing it if it was lost."""
+    if time.monotonic() - getattr(ftp, "last_command", 0) < KEEPALIVE_IDLE:
+        return True
+    return is_connection_alive(ftp) or reconnect_ftp(ftp, logger)
+
+
 def ensure_remote_directory(
     ftp: ftplib.FTP, directory: str, logger: logging.Logger
 ) -> bool:
@@ -64,8 +213,12 @@ def ensure_remote_directory(
                 ftp.mkd(current_dir)
                 ftp.cwd(current_dir)
             except ftplib.error_perm as e:
-                logger.error(f"Failed to create directory {current_dir}: {e!s}")
-                return False
+                # Another connection of the job may have just created it
+                try:
+                    ftp.cwd(current_dir)
+                except ftplib.error_perm:
+                    logger.error(f"Failed to create directory {current_dir}: {e!s}")
+                    return False
 
     # Go back to root
     ftp.cwd("/")
@@ -78,39 +231,111 @@ def upload_file(
     remote_path: str,
     logger: logging.Logger,
     max_retries: int = 3,
+    hasher: StreamHasher | None = None,
+    directories: RemoteDirectoryCache | None = None,
+    progress: FileProgress | None = None,
+    blocksize: int = DEFAULT_BLOCKSIZE,
+    sendfile: bool = False,
+    readahead: int = 0,
+    limiter: BandwidthLimiter | None = None,
+    data_offset: int = 0,
+    length: int | None = None,
 ) -> bool:
-    """Upload a file to the FTP server with retry logic."""
+    """Upload a file to the FTP server with retry logic.
+    A failed attempt is resumed from the size of the partial remote file (REST+STOR,
+    or APPE if the server does not support REST); attempts which made progress do not
+    count against max_retries. If a hasher is given, every block sent is also fed
+    into it, so that after a successful upload it holds the MD5 checksum of the file.
+    directories, if given, avoids checking the remote directory for every file.
+    progress, if given, is advanced with every block sent.
+    With sendfile, the file is sent by the kernel (see storbinary_sendfile) unless it
+    has to be hashed on the way or os.sendfile is not available. With readahead, the
+    blocks are read by a ReadAheadFile of `readahead` buffers while the previous ones
+    are sent (taking precedence over sendfile). limiter, if given, holds the transfer
+    to the bandwidth share of the job. With a length, the file uploaded is the length
+    bytes of local_path from data_offset (e.g. a member of an uncompressed tar)."""
     if not os.path.exists(local_path):
         logger.error(f"Local file not found: {local_path}")
         return False
 
-    file_size = os.path.getsize(local_path)
-    file_name = os.path.basename(local_path)
+    if length is None:
+        file_size = os.path.getsize(local_path) - data_offset
+        file_name = os.path.basename(local_path)
+    else:
+        file_size = length
+        file_name = os.path.basename(remote_path)
+
+    if not ensure_connection(ftp, logger):
+        return False
 
     # Ensure the remote directory exists
     remote_dir = os.path.dirname(remote_path)
-    if not ensure_remote_directory(ftp, remote_dir, logger):
+    if directories:
+        if not directories.ensure(ftp, remote_dir, logger):
+            return False
+    elif not ensure_remote_directory(ftp, remote_dir, logger):
         return False
 
+    # Zero-copy transfers never see the data, which the hasher needs
+    if sendfile and not readahead and not hasher and hasattr(os, "sendfile"):
+        store = storbinary_sendfile
+        callback = _sent_callback(progress, limiter)
+    else:
+        store = _storbinary
+        callback = _transfer_callback(hasher, progress, limiter)
+
     # Retry logic for the upload
-    for attempt in range(1, max_retries + 1):
+    offset = 0
+    attempt = 0
+    while attempt < max_retries:
+        attempt += 1
         try:
-            logger.info(
-                f"Uploading {file_name} ({file_size / 1024 / 1024:.2f} MB) to {remote_path} [Attempt {attempt}/{max_retries}]"
-            )
+            if offset:
+                logger.info(
+                    f"Resuming {file_name} at {offset / 1024 / 1024:.2f} of {file_size / 1024 / 1024:.2f} MB [Attempt {attempt}/{max_retries}]"
+                )
+            else:
+                logger.info(
+                    f"Uploading {file_name} ({file_size / 1024 / 1024:.2f} MB) to {remote_path} [Attempt {attempt}/{max_retries}]"
+                )
 
             # Open and upload the file
             with open(local_path, "rb") as file:
-                # Use STOR command to upload the file
+                # The part already on the server is hashed from the local file
+                file.seek(data_offset)
+                if hasher:
+                    hasher.reset()
+                    hasher.update_from_file(file, offset)
+                file.seek(data_offset + offset)
+                if progress:
+                    progress.restart(offset)
+                source = file if length is None else _FileRange(file, length - offset)
+
                 start_time = time.time()
-                ftp.storbinary(
-                    f"STOR {remote_path}", file, blocksize=8192, callback=lambda _: None
-                )
+                # The server already holds the whole file if only its final reply was lost
+                if offset < file_size or file_size == 0:
+                    reader = (
+                        ReadAheadFile(source, blocksize, readahead)
+                        if readahead
+                        else contextlib.nullcontext(source)
+                    )
+                    with reader as source:
+                        _store_from_offset(
+                            ftp,
+                            remote_path,
+                            source,
+                            offset,
+                            callback=callback,
+                            blocksize=blocksize,
+                            store=store,
+                        )
 
             # Calculate upload speed
             elapsed_time = time.time() - start_time
             upload_speed = (
-                file_size / elapsed_time / 1024 / 1024 if elapsed_time > 0 else 0
+                (file_size - offset) / elapsed_time / 1024 / 1024
+                if elapsed_time > 0
+                else 0
             )
 
             logger.info(f"Successfully uploaded {file_name} ({upload_speed:.2f} MB/s)")
@@ -118,7 +343,21 @@ def upload_file(
 
         except Exception as e:
             logger.error(f"Upload attempt {attempt} failed for {file_name}: {e!s}")
-            if attempt < max_retries:
+
+            # Continue from what the server received, restart if it is unusable
+            remote_size = _remote_size_after_failure(ftp, remote_path, e)
+            reconnected = False
+            if remote_size is None and not is_connection_alive(ftp):
+                # reconnect_ftp already waits between its attempts
+                if not reconnect_ftp(ftp, logger):
+                    break
+                reconnected = True
+                remote_size = _remote_size(ftp, remote_path)
+            previous_offset = offset
+            offset = remote_size if remote_size and remote_size <= file_size else 0
+            if offset > previous_offset:
+                attempt -= 1
+            elif attempt < max_retries and not reconnected:
                 retry_delay = 5 * attempt  # Increase delay with each retry
                 logger.info(f"Retrying in {retry_delay} seconds...")
                 time.sleep(retry_delay)
@@ -127,6 +366,420 @@ def upload_file(
     return False
 
 
+def upload_stream(
+    ftp: ftplib.FTP,
+    stream,
+    remote_path: str,
+    logger: logging.Logger,
+    hasher: StreamHasher | None = None,
+    directories: RemoteDirectoryCache | None = None,
+    progress: FileProgress | None = None,
+    blocksize: int = DEFAULT_BLOCKSIZE,
+    limiter: BandwidthLimiter | None = None,
+) -> bool:
+    """Upload a file read from a stream which cannot be rewound, e.g. a member of a
+    compressed tar, in a single attempt: the caller has to open the stream again to
+    retry. A lost control connection is re-established for the next upload."""
+    file_name = os.path.basename(remote_path)
+    if not ensure_connection(ftp, logger):
+        return False
+
+    remote_dir = os.path.dirname(remote_path)
+    if directories:
+        if not directories.ensure(ftp, remote_dir, logger):
+            return False
+    elif not ensure_remote_directory(ftp, remote_dir, logger):
+        return False
+
+    if hasher:
+        hasher.reset()
+    if progress:
+        progress.restart()
+    logger.info(f"Uploading {file_name} from its archive to {remote_path}")
+    start_time = time.time()
+    try:
+        _storbinary(
+            ftp,
+            f"STOR {remote_path}",
+            stream,
+            blocksize,
+            _transfer_callback(hasher, progress, limiter),
+        )
+    except Exception as e:
+        logger.error(f"Upload failed for {file_name}: {e!s}")
+        remote_size = _remote_size_after_failure(ftp, remote_path, e)
+        if remote_size is None and not is_connection_alive(ftp):
+            reconnect_ftp(ftp, logger)
+        return False
+
+    elapsed_time = time.time() - start_time
+    upload_speed = (
+        stream.tell() / elapsed_time / 1024 / 1024 if elapsed_time > 0 else 0
+    )
+    logger.info(f"Successfully uploaded {file_name} ({upload_speed:.2f} MB/s)")
+    return True
+
+
+def _transfer_callback(
+    hasher: StreamHasher | None,
+    progress: FileProgress | None,
+    limiter: BandwidthLimiter | None = None,
+) -> Callable[[bytes], None]:
+    """storbinary callback feeding the blocks sent to the hasher, the progress and the
+    bandwidth limiter."""
+    updates = [
+        consumer.update for consumer in (hasher, progress, limiter) if consumer
+    ]
+    if len(updates) == 1:
+        return updates[0]
+
+    def callback(block: bytes) -> None:
+        for update in updates:
+            update(block)
+
+    return callback
+
+
+def _sent_callback(
+    progress: FileProgress | None, limiter: BandwidthLimiter | None = None
+) -> Callable[[int], None] | None:
+    """storbinary_sendfile callback, called with the number of bytes sent."""
+    if progress and limiter:
+
+        def callback(nbytes: int) -> None:
+            progress.add(nbytes)
+            limiter.consume(nbytes)
+
+        return callback
+    if progress:
+        return progress.add
+    if limiter:
+        return limiter.consume
+    return None
+
+
+def _store_from_offset(
+    ftp: ftplib.FTP,
+    remote_path: str,
+    file,
+    offset: int,
+    callback,
+    blocksize: int = DEFAULT_BLOCKSIZE,
+    store=None,
+) -> None:
+    """STOR the rest of the file from offset, the file being positioned there.
+    store is the transfer routine, _storbinary or storbinary_sendfile."""
+    store = store or _storbinary
+    if not offset:
+        store(ftp, f"STOR {remote_path}", file, blocksize, callback)
+        return
+
+    try:
+        store(ftp, f"STOR {remote_path}", file, blocksize, callback, rest=offset)
+    except (ftplib.error_perm, ftplib.error_reply) as e:
+        # REST was refused before any data was sent, append instead
+        if not str(e).startswith(("500", "501", "502", "504")):
+            raise
+        store(ftp, f"APPE {remote_path}", file, blocksize, callback)
+
+
+def _storbinary(
+    ftp: ftplib.FTP, cmd: str, file, blocksize: int, callback, rest=None
+) -> str:
+    """The buffered transfer loop of ftplib, reading the file block by block."""
+    return ftp.storbinary(cmd, file, blocksize=blocksize, callback=callback, rest=rest)
+
+
+def storbinary_sendfile(
+    ftp: ftplib.FTP,
+    cmd: str,
+    file,
+    blocksize: int = DEFAULT_BLOCKSIZE,
+    callback: Callable[[int], None] | None = None,
+    rest=None,
+) -> str:
+    """Like ftplib.FTP.storbinary, but the file is copied from its current position to
+    the data connection by the kernel (socket.sendfile), without going through Python
+    buffers. callback, if given, is called with the number of bytes sent after every
+    blocksize bytes. socket.sendfile falls back to a send() loop where the zero-copy
+    path is not supported. A _FileRange is sent up to its end."""
+    end = None
+    if isinstance(file, _FileRange):
+        file, end = file._file, file._file.tell() + file.remaining
+    ftp.voidcmd("TYPE I")
+    with ftp.transfercmd(cmd, rest) as conn:
+        offset = file.tell()
+        while end is None or offset < end:
+            count = blocksize if end is None else min(blocksize, end - offset)
+            sent = conn.sendfile(file, offset, count)
+            if not sent:
+                break
+            offset += sent
+            if callback:
+                callback(sent)
+    return ftp.voidresp()
+
+
+def upload_file_segmented(
+    ftp: CountingFTP,
+    ftp_config: dict[str, str],
+    local_path: str,
+    remote_path: str,
+    streams: int,
+    logger: logging.Logger,
+    blocksize: int = DEFAULT_BLOCKSIZE,
+    progress: FileProgress | None = None,
+    max_retries: int = 3,
+    directories: RemoteDirectoryCache | None = None,
+    limiter: BandwidthLimiter | None = None,
+) -> bool | None:
+    """Upload a file as `streams` byte ranges sent concurrently with REST <offset> +
+    STOR, the first range over ftp and the others over connections opened with
+    connect_ftp, then check the size of the remote file. Ranges are sent with
+    socket.sendfile; a failed range is sent again, except the first one whose plain
+    STOR would truncate the others.
+    Returns True on success, False if a range could not be stored and None if the
+    server refuses writes at an offset (e.g. beyond the end of the file): the file
+    is then to be uploaded as a single stream. The ranges share the bandwidth of
+    limiter, if given."""
+    file_size = os.path.getsize(local_path)
+    file_name = os.path.basename(local_path)
+
+    if not ensure_connection(ftp, logger):
+        return False
+
+    remote_dir = os.path.dirname(remote_path)
+    if directories:
+        if not directories.ensure(ftp, remote_dir, logger):
+            return False
+    elif not ensure_remote_directory(ftp, remote_dir, logger):
+        return False
+
+    # Ranges of whole blocks, the last one taking the rest of the file
+    range_size = max(blocksize, -(-file_size // (streams * blocksize)) * blocksize)
+    ranges = [
+        (offset, min(range_size, file_size - offset))
+        for offset in range(0, file_size, range_size)
+    ]
+
+    connections = [ftp]
+    for _ in ranges[1:]:
+        connection = connect_ftp(ftp_config, logger)
+        if not connection:
+            for extra in connections[1:]:
+                close_ftp(extra, logger)
+            return False
+        connection.sndbuf = ftp.sndbuf
+        connections.append(connection)
+
+    logger.info(
+        f"Uploading {file_name} ({file_size / 1024 / 1024:.2f} MB) to {remote_path} in {len(ranges)} ranges of {range_size / 1024 / 1024:.2f} MB"
+    )
+
+    # The plain STOR of the first range creates (and truncates) the remote file
+    first_opened = threading.Event()
+    cancelled = threading.Event()
+    progress_lock = threading.Lock()
+    results: list[bool | None] = [False] * len(ranges)
+    sent_bytes = [0] * len(ranges)
+
+    def send_range(index: int) -> None:
+        offset, length = ranges[index]
+        connection = connections[index]
+
+        def callback(nbytes: int) -> None:
+            sent_bytes[index] += nbytes
+            if progress:
+                with progress_lock:
+                    progress.add(nbytes)
+            if limiter and nbytes > 0:
+                limiter.consume(nbytes)
+
+        attempts = max_retries if index else 1
+        try:
+            if index:
+                first_opened.wait()
+            for attempt in range(1, attempts + 1):
+                if cancelled.is_set():
+                    return
+                try:
+                    _store_range(
+                        connection,
+                        remote_path,
+                        local_path,
+                        offset,
+                        length,
+                        blocksize,
+                        callback,
+                        cancelled,
+                        first_opened if index == 0 else None,
+                    )
+                    results[index] = not cancelled.is_set()
+                    return
+                except _OffsetRejected as e:
+                    logger.warning(
+                        f"Server refused to write {file_name} at offset {offset}: {e!s}"
+                    )
+                    results[index] = None
+                    cancelled.set()
+                    return
+                except Exception as e:
+                    logger.error(
+                        f"Range {index + 1}/{len(ranges)} of {file_name} failed [Attempt {attempt}/{attempts}]: {e!s}"
+                    )
+                    _remote_size_after_failure(connection, remote_path, e)
+                    if not is_connection_alive(connection) and not reconnect_ftp(
+                        connection, logger
+                    ):
+                        break
+                    # The range is sent again from its start
+                    callback(-sent_bytes[index])
+            cancelled.set()
+        finally:
+            # Never leave the other ranges waiting for the first one
+            if index == 0:
+                first_opened.set()
+
+    threads = [
+        threading.Thread(target=send_range, args=(index,))
+        for index in range(len(ranges))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for extra in connections[1:]:
+        ftp.round_trips += extra.round_trips
+        close_ftp(extra, logger)
+
+    if None in results:
+        return None
+    if not all(results):
+        logger.error(f"Segmented upload failed for {file_name}")
+        return False
+
+    # The control connection was idle during the transfer of the first range
+    if not ensure_connection(ftp, logger):
+        return False
+    try:
+        ftp.voidcmd("TYPE I")
+        remote_size = ftp.size(remote_path)
+    except ftplib.all_errors as e:
+        logger.error(f"Could not check the size of {remote_path}: {e!s}")
+        return False
+    if remote_size != file_size:
+        logger.error(
+            f"Segmented upload of {file_name} left {remote_size} bytes on the server, expected {file_size}"
+        )
+        return False
+
+    logger.info(f"Successfully uploaded {file_name} in {len(ranges)} ranges")
+    return True
+
+
+def _store_range(
+    ftp: ftplib.FTP,
+    remote_path: str,
+    local_path: str,
+    offset: int,
+    length: int,
+    blocksize: int,
+    callback: Callable[[int], None],
+    cancelled: threading.Event,
+    opened: threading.Event | None = None,
+) -> None:
+    """STOR length bytes of the file from offset (REST offset) with socket.sendfile,
+    setting opened once the server opened the remote file. Stops early if cancelled."""
+    ftp.voidcmd("TYPE I")
+    with open(local_path, "rb") as file:
+        try:
+            conn = ftp.transfercmd(f"STOR {remote_path}", offset or None)
+        except ftplib.error_perm as e:
+            if offset:
+                raise _OffsetRejected(str(e)) from e
+            raise
+        finally:
+            if opened:
+                opened.set()
+
+        with conn:
+            position = offset
+            end = offset + length
+            while position < end and not cancelled.is_set():
+                sent = conn.sendfile(file, position, min(blocksize, end - position))
+                if not sent:
+                    raise OSError(f"Unexpected end of file at {position}")
+                position += sent
+                callback(sent)
+    ftp.voidresp()
+
+
+def probe_blocksize(
+    ftp: ftplib.FTP,
+    local_path: str,
+    remote_dir: str,
+    probe_bytes: int,
+    logger: logging.Logger,
+    blocksizes: tuple[int, ...] = PROBE_BLOCKSIZES,
+) -> int | None:
+    """Upload the first probe_bytes of a file to a scratch remote file, in equal
+    shares sent with each block size, and return the fastest block size.
+    Only the block size varies, the data connections keep the send buffer of ftp.
+    Returns None if the probe failed."""
+    remote_path = remote_dir.rstrip("/") + "/" + PROBE_REMOTE_NAME
+    share = probe_bytes // len(blocksizes)
+    throughputs = {}
+    try:
+        with open(local_path, "rb") as file:
+            for blocksize in blocksizes:
+                file.seek(0)
+                reader = _FileRange(file, share)
+                start_time = time.monotonic()
+                ftp.storbinary(f"STOR {remote_path}", reader, blocksize=blocksize)
+                elapsed_time = time.monotonic() - start_time
+                throughputs[blocksize] = (
+                    (share - reader.remaining) / elapsed_time if elapsed_time else 0
+                )
+                logger.info(
+                    f"Probe: block size {blocksize // 1024} KB, {throughputs[blocksize] / 1024 / 1024:.2f} MB/s"
+                )
+        ftp.delete(remote_path)
+    except (*ftplib.all_errors, OSError) as e:
+        logger.warning(f"Transfer probe failed: {e!s}")
+        return None
+
+    return max(throughputs, key=throughputs.get)
+
+
+def _remote_size_after_failure(
+    ftp: ftplib.FTP, remote_path: str, error: Exception
+) -> int | None:
+    """Return the size of the partial remote file after a failed transfer, or None
+    if it cannot be known (e.g. the control connection is broken)."""
+    try:
+        # A transfer interrupted by a socket error may leave the server's
+        # final reply (e.g. 426) unread on the control connection
+        if not isinstance(error, ftplib.Error) and ftp.sock:
+            readable, _, _ = select.select([ftp.sock], [], [], REPLY_DRAIN_TIMEOUT)
+            if readable:
+                try:
+                    ftp.voidresp()
+                except ftplib.Error:
+                    pass
+    except (*ftplib.all_errors, ValueError):
+        return None
+    return _remote_size(ftp, remote_path)
+
+
+def _remote_size(ftp: ftplib.FTP, remote_path: str) -> int | None:
+    """Return the size of a remote file, or None if it cannot be known."""
+    try:
+        ftp.voidcmd("TYPE I")
+        return ftp.size(remote_path)
+    except (*ftplib.all_errors, ValueError, AttributeError):
+        return None
+
+
 def verify_upload(
     ftp: ftplib.FTP, remote_path: str, expected_size: int, logger: logging.Logger
 ) -> bool:
@@ -163,6 +816,55 @@ def verify_upload(
         return False
 
 
+def verify_uploads(
+    ftp: ftplib.FTP,
+    remote_dir: str,
+    expected_sizes: dict[str, int],
+    logger: logging.Logger,
+) -> set[str] | None:
+    """Verify the sizes of several files of a remote directory with a single listing.
+    Returns the names of the files verified, None if the directory cannot be listed."""
+    remote_files = list_remote_files(ftp, remote_dir, logger)
+    if remote_files is None:
+        return None
+
+    verified = set()
+    for file_name, expected_size in expected_sizes.items():
+        remote_path = remote_dir.rstrip("/") + "/" + file_name
+        file_size = remote_files.get(file_name)
+        if file_size is None:
+            logger.error(f"Verification failed: File {remote_path} not found on server")
+        elif file_size == int(expected_size):
+            logger.info(f"Verification successful: {remote_path} ({file_size} bytes)")
+            verified.add(file_name)
+        else:
+            logger.error(
+                f"Verification failed: Size mismatch for {remote_path} (Expected: {expected_size}, Got: {file_size})"
+            )
+    return verified
+
+
+def list_remote_files(
+    ftp: ftplib.FTP, remote_dir: str, logger: logging.Logger
+) -> dict[str, int] | None:
+    """Return {file_name: size} of the files in a remote directory with a single MLSD.
+    Returns an empty dict if the directory does not exist, None if it cannot be listed."""
+    try:
+        return {
+            file_name: int(facts["size"])
+            for file_name, facts in ftp.mlsd(remote_dir, facts=["type", "size"])
+            if facts.get("type") == "file" and "size" in facts
+        }
+    except ftplib.error_perm as e:
+        if str(e).startswith("550"):
+            return {}
+        logger.error(f"Failed to list remote directory {remote_dir}: {e!s}")
+        return None
+    except (*ftplib.all_errors, ValueError) as e:
+        logger.error(f"Failed to list remote directory {remote_dir}: {e!s}")
+        return None
+
+
 def close_ftp(ftp: ftplib.FTP, logger: logging.Logger) -> None:
     """Safely close an FTP connection."""
     try:
@@ -0,0 +1,87 @@
+import queue
+import threading
+import zlib
+from collections.abc import Callable
+
+# Bounds the decompressed output (and memory) of a single inflate call
+INFLATE_OUTPUT_LIMIT = 1024 * 1024
+
+
+def is_gzip_file(file_path: str) -> bool:
+    """Whether the file is expected to be gzip compressed, judging by its name."""
+    return file_path.endswith(".gz")
+
+
+class GzipVerifier:
+    """Validates a gzip stream fed with the chunks read for hashing.
+
+    zlib checks the CRC32 and ISIZE trailer of every member (concatenated members,
+    as written by bgzip, are supported). Decompression runs on its own thread and
+    releases the GIL, so it does not throttle the hashing thread; the queue of
+    pending chunks is bounded to keep memory flat. The decompressed data is passed
+    to on_data if given (e.g. FASTQ statistics), otherwise discarded.
+    """
+
+    def __init__(
+        self,
+        on_data: Callable[[bytes], None] | None = None,
+        max_pending_chunks: int = 8,
+    ):
+        self._on_data = on_data
+        self._queue: queue.Queue[bytes | None] = queue.Queue(maxsize=max_pending_chunks)
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._members = 0
+        self._error: str | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, chunk) -> None:
+        """Queue a chunk of the compressed file, copying it since read buffers are reused."""
+        self._queue.put(bytes(chunk))
+
+    def result(self) -> tuple[bool, str]:
+        """Wait for all queued chunks and return (ok, reason)."""
+        self._queue.put(None)
+        self._thread.join()
+
+        if self._error:
+            return False, self._error
+        if not self._decompressor.eof:
+            return False, "truncated gzip stream"
+        if self._members == 0:
+            return False, "empty gzip stream"
+        return True, f"{self._members} gzip member(s) verified"
+
+    def _run(self) -> None:
+        while (chunk := self._queue.get()) is not None:
+            # After an error keep draining, so the hashing thread never blocks
+            if self._error:
+                continue
+            try:
+                self._inflate(chunk)
+            except zlib.error as e:
+                self._error = str(e)
+            except Exception as e:
+                # e.g. raised by on_data, the thread must survive to drain the queue
+                self._error = f"{type(e).__name__} while decompressing: {e!s}"
+
+    def _inflate(self, data: bytes) -> None:
+        while True:
+            if self._decompressor.eof:
+                if not data:
+                    break
+                # The previous member is complete, the next bytes start a new one
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+            output = self._decompressor.decompress(data, INFLATE_OUTPUT_LIMIT)
+            if self._on_data and output:
+                self._on_data(output)
+
+            if self._decompressor.eof:
+                self._members += 1
+                data = self._decompressor.unused_data
+            else:
+                data = self._decompressor.unconsumed_tail
+                # A full output buffer may leave data pending even without input
+                if not data and len(output) < INFLATE_OUTPUT_LIMIT:
+                    break
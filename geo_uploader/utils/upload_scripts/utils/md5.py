@@ -1,47 +1,499 @@
 # geo_utils/md5.py
+import csv
 import hashlib
 import logging
+import mmap
 import os
+import threading
+import time
+from collections.abc import Callable
 
+from geo_uploader.utils.upload_scripts.utils.checksum_cache import ChecksumCache
+from geo_uploader.utils.upload_scripts.utils.fastq_stats import FastqStats
+from geo_uploader.utils.upload_scripts.utils.gzip_check import (
+    GzipVerifier,
+    is_gzip_file,
+)
+from geo_uploader.utils.upload_scripts.utils.progress import ProgressReporter
+from geo_uploader.utils.upload_scripts.utils.tar_members import iter_tar_members
 
-def calculate_md5(file_path: str) -> str:
-    """Calculate the MD5 checksum of a file."""
+# Size of the reusable read buffer, allocated once per worker thread
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+# Files below this size are hashed with hashlib.file_digest
+SMALL_FILE_SIZE = 64 * 1024 * 1024
+# Hashed pages are dropped from the page cache once this many bytes were read
+FADVISE_WINDOW = 64 * 1024 * 1024
+
+# Columns of md5sheet.tsv, size is used to validate rows when resuming a job
+# gzip_ok is True/False for verified .gz files, NA otherwise
+TSV_COLUMNS = ["file_name", "file_type", "md5sum", "path", "sample", "size", "gzip_ok"]
+
+_thread_buffers = threading.local()
+
+ChunkCallback = Callable[[memoryview], None]
+
+
+def _get_read_buffer() -> memoryview:
+    """Return the read buffer of the current thread, allocating it on first use."""
+    buffer = getattr(_thread_buffers, "buffer", None)
+    if buffer is None:
+        buffer = memoryview(bytearray(READ_BUFFER_SIZE))
+        _thread_buffers.buffer = buffer
+    return buffer
+
+
+def _fadvise(fd: int, offset: int, length: int, advice_name: str) -> None:
+    """Give the kernel a hint about our access pattern, where supported."""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return
     try:
-        hash_md5 = hashlib.md5(usedforsecurity=False)
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+def _hash_readinto(f, hash_md5, on_chunk: ChunkCallback | None) -> None:
+    """Read into a reusable buffer, no allocation per chunk.
+    Pages already hashed are dropped so the web server keeps its page cache."""
+    fd = f.fileno()
+    _fadvise(fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+
+    buffer = _get_read_buffer()
+    offset = 0
+    dropped = 0
+    while n := f.readinto(buffer):
+        hash_md5.update(buffer[:n])
+        offset += n
+        if on_chunk:
+            on_chunk(buffer[:n])
+        if offset - dropped >= FADVISE_WINDOW:
+            _fadvise(fd, dropped, offset - dropped, "POSIX_FADV_DONTNEED")
+            dropped = offset
+    _fadvise(fd, dropped, 0, "POSIX_FADV_DONTNEED")
+
+
+def _hash_file_digest(f, hash_md5, on_chunk: ChunkCallback | None) -> None:
+    """Let hashlib.file_digest drive the reads, best for small files.
+    The chunks are not exposed, so on_chunk is never called."""
+    hashlib.file_digest(f, lambda: hash_md5)
+
+
+def _hash_mmap(f, hash_md5, on_chunk: ChunkCallback | None) -> None:
+    """Hash a memory-mapped view of the file, no copy through userspace buffers."""
+    if os.fstat(f.fileno()).st_size == 0:
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        try:
+            for offset in range(0, len(mapped), READ_BUFFER_SIZE):
+                chunk = view[offset : offset + READ_BUFFER_SIZE]
                 hash_md5.update(chunk)
+                if on_chunk:
+                    on_chunk(chunk)
+        finally:
+            view.release()
+
+
+HASH_STRATEGIES: dict[str, Callable] = {
+    "readinto": _hash_readinto,
+    "file_digest": _hash_file_digest,
+    "mmap": _hash_mmap,
+}
+# Strategies passing every chunk read to on_chunk
+STREAMING_STRATEGIES = {"readinto", "mmap"}
+
+
+def select_hash_strategy(
+    file_size: int, strategy: str = "auto", streaming: bool = False
+) -> str:
+    """Return the read strategy to use for a file of the given size.
+    'auto' picks file_digest for small files and readinto (with fadvise) otherwise.
+    With streaming, the chunks must be exposed to a consumer, file_digest is not used."""
+    if strategy in HASH_STRATEGIES and (
+        not streaming or strategy in STREAMING_STRATEGIES
+    ):
+        return strategy
+    if streaming:
+        return "readinto"
+    return "file_digest" if file_size < SMALL_FILE_SIZE else "readinto"
+
+
+def calculate_md5(
+    file_path: str,
+    strategy: str = "auto",
+    on_chunk: ChunkCallback | None = None,
+) -> str:
+    """Calculate the MD5 checksum of a file.
+    on_chunk, if given, is called with every chunk hashed by streaming strategies,
+    as a memoryview only valid during the call."""
+    try:
+        hash_md5 = hashlib.md5(usedforsecurity=False)
+        with open(file_path, "rb", buffering=0) as f:
+            file_size = os.fstat(f.fileno()).st_size
+            HASH_STRATEGIES[select_hash_strategy(file_size, strategy)](
+                f, hash_md5, on_chunk
+            )
+        return hash_md5.hexdigest()
+    except Exception as e:
+        return f"ERROR: {e}"
+
+
+def calculate_md5_member(
+    file_info: dict,
+    stream=None,
+    on_chunk: ChunkCallback | None = None,
+) -> str:
+    """Calculate the MD5 checksum of a member of a tar, read from stream if given (a
+    reader of its data, see iter_tar_members), from its byte range in an uncompressed
+    tar ('offset', see resolve_tar_members), or else by reading the tar up to it."""
+    size = int(file_info["size"])
+    try:
+        hash_md5 = hashlib.md5(usedforsecurity=False)
+        if stream is not None:
+            _hash_range(stream, size, hash_md5, on_chunk)
+        elif file_info.get("offset") is not None:
+            with open(file_info["tar_path"], "rb", buffering=0) as f:
+                f.seek(file_info["offset"])
+                _hash_range(f, size, hash_md5, on_chunk)
+        else:
+            # A member of a compressed tar, hashed on its own
+            members = iter_tar_members(file_info["tar_path"], [file_info])
+            try:
+                _, member_stream = next(members)
+            except StopIteration:
+                raise FileNotFoundError(
+                    f"{file_info['file_name']} not found in the tar"
+                ) from None
+            try:
+                _hash_range(member_stream, size, hash_md5, on_chunk)
+            finally:
+                members.close()
         return hash_md5.hexdigest()
     except Exception as e:
         return f"ERROR: {e}"
 
 
-def write_to_tsv(tsv_file_path: str, file_info: dict, logger: logging.Logger) -> bool:
+def _hash_range(f, nbytes: int, hash_md5, on_chunk: ChunkCallback | None) -> None:
+    """Hash the next nbytes of f into the reusable buffer."""
+    buffer = _get_read_buffer()
+    while nbytes > 0:
+        n = f.readinto(buffer[: min(nbytes, len(buffer))])
+        if not n:
+            raise EOFError(f"{nbytes} bytes missing to hash")
+        chunk = buffer[:n]
+        hash_md5.update(chunk)
+        if on_chunk:
+            on_chunk(chunk)
+        nbytes -= n
+
+
+class StreamHasher:
+    """MD5 of a byte stream fed chunk by chunk, e.g. from the storbinary callback,
+    so uploaded files are hashed without being read a second time."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Start over, e.g. when an upload is retried from the beginning."""
+        self._hash_md5 = hashlib.md5(usedforsecurity=False)
+        self.bytes_hashed = 0
+
+    def update(self, chunk: bytes) -> None:
+        """Feed the next chunk of the stream."""
+        self._hash_md5.update(chunk)
+        self.bytes_hashed += len(chunk)
+
+    def update_from_file(self, f, nbytes: int) -> None:
+        """Feed the next nbytes read from f, e.g. the part of a file already on the
+        server when its upload is resumed."""
+        buffer = _get_read_buffer()
+        while nbytes > 0:
+            n = f.readinto(buffer[: min(nbytes, len(buffer))])
+            if not n:
+                raise EOFError(f"{nbytes} bytes missing to hash")
+            self.update(buffer[:n])
+            nbytes -= n
+
+    def hexdigest(self) -> str:
+        """Return the checksum of everything fed so far."""
+        return self._hash_md5.hexdigest()
+
+
+def build_md5_row(
+    file_info: dict, md5sum: str, file_size: int, gzip_ok: bool | None = None
+) -> dict:
+    """Return the TSV row of a file whose checksum is known."""
+    return {
+        "file_name": file_info.get("file_name", "unknown_file_name"),
+        "file_type": file_info.get("file_type", "unknown"),
+        "md5sum": md5sum,
+        "path": file_info.get("path"),
+        "sample": file_info.get("sample", "unknown_sample"),
+        "size": file_size,
+        "gzip_ok": "NA" if gzip_ok is None else str(gzip_ok),
+    }
+
+
+def compute_md5_row(
+    file_info: dict,
+    logger: logging.Logger,
+    strategy: str = "auto",
+    cache: ChecksumCache | None = None,
+    progress: ProgressReporter | None = None,
+    verify_gzip: bool = False,
+    stats: FastqStats | None = None,
+    stream=None,
+) -> dict | None:
+    """Calculate the MD5 checksum of a file and return its TSV row.
+    file_info is expected to have {'sample', 'path', 'file_name', 'file_type'}
+    The checksum cache, if given, is consulted before reading the file.
+    With verify_gzip, .gz files are also decompressed from the same reads.
+    stats, if given, is fed with the (decompressed) content of the file.
+    Members of tar archives ('tar_path', 'offset' and 'size') are hashed from their
+    byte range in the tar, or from stream for compressed tars.
+    Returns None if the file does not exist. Safe to call from worker threads.
+    """
+    tar_path = file_info.get("tar_path")
+    file_path = tar_path or file_info.get("path")
+    if not file_path or not os.path.isfile(file_path):
+        logger.warning(f"File not found - {file_path}")
+        if progress:
+            progress.finish_file(file_info.get("file_name", ""))
+        return None
+
+    file_name = file_info.get("file_name", "unknown_file_name")
+    verifier = None
+    if (verify_gzip or stats) and is_gzip_file(file_info["path"]):
+        verifier = GzipVerifier(on_data=stats.update if stats else None)
+    inspecting = bool(verifier or stats)
+
+    # The cache only knows checksums, files to inspect have to be read anyway
+    cache_key = ChecksumCache.file_info_key(file_info) if cache else None
+    if cache and cache_key and not inspecting:
+        cached_md5sum = cache.get(cache_key)
+        if cached_md5sum:
+            logger.info(f"Checksum cache hit for {file_name}")
+            if progress:
+                progress.finish_file(file_name, cache_key[3])
+            return build_md5_row(file_info, cached_md5sum, cache_key[3])
+
+    if tar_path:
+        file_size = int(file_info["size"])
+        strategy = "tar"
+        streaming = True
+    else:
+        file_size = os.path.getsize(file_path)
+        strategy = select_hash_strategy(file_size, strategy, streaming=inspecting)
+        streaming = strategy in STREAMING_STRATEGIES
+
+    def on_chunk(chunk: memoryview) -> None:
+        if verifier:
+            verifier.feed(chunk)
+        elif stats:
+            stats.update(chunk)
+        if progress:
+            progress.advance(len(chunk))
+
+    if progress:
+        progress.start_file(file_name)
+    start_time = time.perf_counter()
+    chunk_callback = on_chunk if streaming and (inspecting or progress) else None
+    if tar_path:
+        md5sum = calculate_md5_member(file_info, stream, chunk_callback)
+    else:
+        md5sum = calculate_md5(file_path, strategy, on_chunk=chunk_callback)
+    elapsed_time = time.perf_counter() - start_time
+    if progress:
+        progress.finish_file(file_name, 0 if streaming else file_size)
+
+    hash_speed = file_size / elapsed_time / 1024 / 1024 if elapsed_time > 0 else 0
+    logger.info(
+        f"Hashed {file_name} ({file_size / 1024 / 1024:.2f} MB) in {elapsed_time:.2f}s ({hash_speed:.2f} MB/s, {strategy})"
+    )
+
+    gzip_ok = None
+    gzip_error = None
+    if verifier:
+        verified, reason = verifier.result()
+        gzip_error = None if verified else reason
+        if verify_gzip:
+            gzip_ok = verified
+            if verified:
+                logger.info(f"gzip integrity of {file_name}: {reason}")
+            else:
+                logger.error(f"gzip integrity check failed for {file_name}: {reason}")
+    if stats:
+        stats.finish(gzip_error)
+        logger.info(
+            f"FASTQ stats of {file_name}: {stats.reads} reads{', ' + stats.error if stats.error else ''}"
+        )
+
+    # Only cache the checksum if the file did not change while it was read
+    if (
+        cache
+        and cache_key
+        and not md5sum.startswith("ERROR")
+        and ChecksumCache.file_info_key(file_info) == cache_key
+    ):
+        cache.put(cache_key, md5sum)
+
+    return build_md5_row(file_info, md5sum, file_size, gzip_ok)
+
+
+def _format_tsv_row(row: dict) -> str:
+    """Return the md5sheet.tsv line of a row."""
+    return "\t".join(str(row[column]) for column in TSV_COLUMNS) + "\n"
+
+
+class Md5SheetWriter:
+    """Crash-safe md5sheet.tsv writer keeping a single handle open.
+
+    Every row is flushed and fsynced as soon as its file is done, so after a crash
+    the sheet holds all completed files. On start, completed rows of the files of
+    the job are kept (if the file size still matches) and only the remaining files
+    need to be hashed. Safe to use from several threads.
+    """
+
+    def __init__(self, tsv_file_path: str, logger: logging.Logger):
+        self.tsv_file_path = tsv_file_path
+        self.logger = logger
+        self._tsv_file = None
+        self._lock = threading.Lock()
+
+    def start(
+        self,
+        files: list[dict] | None = None,
+        reprocess: Callable[[dict], bool] | None = None,
+    ) -> list[dict]:
+        """Open the sheet and return the files still to be processed.
+        Without files, the sheet starts empty. Completed rows for which reprocess
+        returns True (e.g. missing a check) are processed again. Raises OSError on failure."""
+        kept_rows = []
+        pending_files = []
+        completed_rows = self._read_completed_rows() if files else {}
+
+        for file_info in files or []:
+            row = completed_rows.get(file_info.get("path"))
+            if (
+                row
+                and self._is_still_valid(row, file_info)
+                and not (reprocess and reprocess(row))
+            ):
+                kept_rows.append(row)
+            else:
+                pending_files.append(file_info)
+
+        # Rewrite the kept rows atomically, dropping stale or partially written lines
+        temp_path = f"{self.tsv_file_path}.tmp"
+        with open(temp_path, "w") as temp_file:
+            temp_file.write("\t".join(TSV_COLUMNS) + "\n")
+            for row in kept_rows:
+                temp_file.write(_format_tsv_row(row))
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, self.tsv_file_path)
+
+        self._tsv_file = open(self.tsv_file_path, "a")
+        if kept_rows:
+            self.logger.info(
+                f"Resuming {self.tsv_file_path}: {len(kept_rows)} files already done, {len(pending_files)} remaining"
+            )
+        else:
+            self.logger.info(f"Initialized TSV file: {self.tsv_file_path}")
+        return pending_files
+
+    def write_row(self, row: dict) -> bool:
+        """Append a completed row and make it durable."""
+        try:
+            with self._lock:
+                if self._tsv_file is None:
+                    raise ValueError("writer was not started")
+                self._tsv_file.write(_format_tsv_row(row))
+                self._tsv_file.flush()
+                os.fsync(self._tsv_file.fileno())
+
+            self.logger.debug(
+                f"Added to TSV: {row['sample']} ({row['file_type']}) - MD5: {row['md5sum']}"
+            )
+            return True
+        except Exception as e:
+            self.logger.error(f"Error writing to TSV: {e!s}")
+            return False
+
+    def close(self) -> None:
+        """Close the sheet handle."""
+        with self._lock:
+            if self._tsv_file:
+                self._tsv_file.close()
+                self._tsv_file = None
+
+    def _read_completed_rows(self) -> dict[str, dict]:
+        """Return the rows of a previous run by path, ignoring malformed lines."""
+        if not os.path.isfile(self.tsv_file_path):
+            return {}
+
+        completed_rows = {}
+        try:
+            with open(self.tsv_file_path, newline="") as tsv_file:
+                reader = csv.DictReader(tsv_file, delimiter="\t")
+                # Sheets written before gzip verification have no gzip_ok column
+                required_columns = [c for c in TSV_COLUMNS if c != "gzip_ok"]
+                if not reader.fieldnames or not set(required_columns) <= set(
+                    reader.fieldnames
+                ):
+                    return {}
+                for row in reader:
+                    if all(row.get(column) for column in required_columns):
+                        row["gzip_ok"] = row.get("gzip_ok") or "NA"
+                        completed_rows[row["path"]] = row
+        except (OSError, csv.Error) as e:
+            self.logger.warning(f"Could not read previous TSV rows: {e!s}")
+            return {}
+        return completed_rows
+
+    @staticmethod
+    def _is_still_valid(row: dict, file_info: dict) -> bool:
+        """A row is reused if its checksum is complete and the file size is unchanged
+        (for tar members, the size listed in the INI file and the tar still there)."""
+        if len(row["md5sum"]) != 32 or row["md5sum"].startswith("ERROR"):
+            return False
+        try:
+            if file_info.get("tar_path"):
+                tar_found = os.path.isfile(file_info["tar_path"])
+                return tar_found and int(row["size"]) == int(file_info["size"])
+            return os.path.getsize(row["path"]) == int(row["size"])
+        except (OSError, ValueError):
+            return False
+
+
+def write_to_tsv(
+    tsv_file_path: str,
+    file_info: dict,
+    logger: logging.Logger,
+    cache: ChecksumCache | None = None,
+) -> bool:
     """Write file information to a TSV file.
     file_info is expected to have {'sample', 'path', 'filename', 'file_type'}
 
     """
 
     try:
-        file_path = file_info.get("path")
-        file_type = file_info.get("file_type", "unknown")
-        sample_name = file_info.get("sample", "unknown_sample")
-        file_name = file_info.get("file_name", "unknown_file_name")
-
         # todo, what if we don't have file_name?
-        if not file_path or not os.path.isfile(file_path):
-            logger.warning(f"File not found - {file_path}")
+        row = compute_md5_row(file_info, logger, cache=cache)
+        if row is None:
             return False
 
-        md5sum = calculate_md5(file_path)
-
         # Append to the TSV file
         with open(tsv_file_path, "a") as tsv_file:
-            tsv_file.write(
-                f"{file_name}\t{file_type}\t{md5sum}\t{file_path}\t{sample_name}\n"
-            )
+            tsv_file.write(_format_tsv_row(row))
 
-        logger.debug(f"Added to TSV: {sample_name} ({file_type}) - MD5: {md5sum}")
+        logger.debug(
+            f"Added to TSV: {row['sample']} ({row['file_type']}) - MD5: {row['md5sum']}"
+        )
         return True
     except Exception as e:
         logger.error(f"Error writing to TSV: {e!s}")
@@ -52,7 +504,7 @@ def initialize_tsv(tsv_file_path: str, logger: logging.Logger) -> bool:
     """Initialize a new TSV file with headers."""
     try:
         with open(tsv_file_path, "w") as tsv_file:
-            tsv_file.write("file_name\tfile_type\tmd5sum\tpath\tsample\n")
+            tsv_file.write("\t".join(TSV_COLUMNS) + "\n")
         logger.info(f"Initialized TSV file: {tsv_file_path}")
         return True
     except Exception as e:
@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class FileProgress:
+    """Progress of a single file, its update() can be passed as a transfer callback.
+    Only one thread reports the progress of a file."""
+
+    __slots__ = ("_reporter", "name", "size", "bytes_done", "started")
+
+    def __init__(self, reporter: "ProgressReporter", name: str, size: int):
+        self._reporter = reporter
+        self.name = name
+        self.size = size
+        self.bytes_done = 0
+        self.started = time.monotonic()
+
+    def update(self, block) -> None:
+        """Account for a block sent or read."""
+        self.add(len(block))
+
+    def add(self, nbytes: int) -> None:
+        """Account for nbytes sent or read."""
+        self.bytes_done += nbytes
+        self._reporter.advance(nbytes)
+
+    def restart(self, offset: int = 0) -> None:
+        """Start over from offset, e.g. when a transfer is retried or resumed."""
+        self._reporter.advance(offset - self.bytes_done)
+        self.bytes_done = offset
+
+
+class ProgressReporter:
+    """Publishes the progress of a job to a small JSON file read by the web server.
+
+    Workers call advance() with the bytes they processed; the file is rewritten
+    (atomically) at most once every `interval` seconds, so reporting costs a lock
+    and a clock read per chunk. With a heartbeat the file is also rewritten while
+    nothing advances, and the job is reported as stalled after `stall_timeout`
+    seconds without progress.
+    """
+
+    def __init__(
+        self,
+        progress_path: str,
+        total_bytes: int,
+        total_files: int,
+        logger: logging.Logger,
+        interval: float = 1.0,
+        window: float = 30.0,
+        stall_timeout: float | None = None,
+    ):
+        self.progress_path = progress_path
+        self.total_bytes = total_bytes
+        self.total_files = total_files
+        self.logger = logger
+        self.interval = interval
+        self.window = window
+        self.stall_timeout = stall_timeout
+
+        self.bytes_done = 0
+        self.files_done = 0
+        self.current_files: list[str] = []
+        self.stalled = False
+
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self._last_advance = time.monotonic()
+        self._files: dict[str, FileProgress] = {}
+        # (monotonic time, bytes_done) samples for the rolling throughput
+        self._samples: deque[tuple[float, int]] = deque()
+        self._heartbeat: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start_file(self, file_name: str, file_size: int = 0) -> FileProgress:
+        """Mark a file as being processed, returning its FileProgress."""
+        file_progress = FileProgress(self, file_name, file_size)
+        with self._lock:
+            self.current_files.append(file_name)
+            self._files[file_name] = file_progress
+        self._maybe_write(time.monotonic())
+        return file_progress
+
+    def advance(self, nbytes: int) -> None:
+        """Account for nbytes processed, cheap enough to call for every chunk."""
+        now = time.monotonic()
+        with self._lock:
+            self.bytes_done += nbytes
+            self._last_advance = now
+        self._maybe_write(now)
+
+    def finish_file(self, file_name: str, remaining_bytes: int = 0) -> None:
+        """Mark a file as done, adding the bytes which were not reported by advance()
+        (e.g. files served from a cache or hashed without chunk callbacks)."""
+        with self._lock:
+            self.bytes_done += remaining_bytes
+            self.files_done += 1
+            if file_name in self.current_files:
+                self.current_files.remove(file_name)
+            self._files.pop(file_name, None)
+        self._maybe_write(time.monotonic())
+
+    def start_heartbeat(self) -> None:
+        """Rewrite the progress file every interval from a background thread, so that
+        a stalled job is noticed."""
+        self._heartbeat = threading.Thread(target=self._run_heartbeat, daemon=True)
+        self._heartbeat.start()
+
+    def finish(self, status: str = "COMPLETED") -> None:
+        """Write the final state of the job."""
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        self.write(status)
+
+    def _run_heartbeat(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def _maybe_write(self, now: float) -> None:
+        if now - self._last_write >= self.interval:
+            self.write()
+
+    def write(self, status: str = "RUNNING") -> None:
+        """Write the progress file now."""
+        with self._lock:
+            now = time.monotonic()
+            self._last_write = now
+
+            # Instantaneous throughput since the previous write
+            previous_time, previous_bytes = self._samples[-1] if self._samples else (now, 0)
+            elapsed = now - previous_time
+            instant = (self.bytes_done - previous_bytes) / elapsed if elapsed else 0
+
+            self._samples.append((now, self.bytes_done))
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+
+            oldest_time, oldest_bytes = self._samples[0]
+            elapsed = now - oldest_time
+            throughput = (self.bytes_done - oldest_bytes) / elapsed if elapsed else 0
+            remaining_bytes = max(0, self.total_bytes - self.bytes_done)
+            eta_seconds = int(remaining_bytes / throughput) if throughput else None
+
+            self._check_stall(now, status)
+
+            files = []
+            for file_progress in self._files.values():
+                file_elapsed = now - file_progress.started
+                files.append(
+                    {
+                        "name": file_progress.name,
+                        "size": file_progress.size,
+                        "bytes_done": file_progress.bytes_done,
+                        "throughput_bps": int(file_progress.bytes_done / file_elapsed)
+                        if file_elapsed
+                        else 0,
+                    }
+                )
+
+            progress = {
+                "status": status,
+                "total_bytes": self.total_bytes,
+                "bytes_done": self.bytes_done,
+                "total_files": self.total_files,
+                "files_done": self.files_done,
+                "current_files": list(self.current_files),
+                "files": files,
+                "throughput_bps": int(throughput),
+                "instant_bps": int(max(instant, 0)),
+                "eta_seconds": eta_seconds,
+                "stalled": self.stalled,
+                "idle_seconds": int(now - self._last_advance),
+                "updated_at": datetime.now().isoformat(),
+            }
+
+            temp_path = f"{self.progress_path}.tmp"
+            try:
+                with open(temp_path, "w") as f:
+                    json.dump(progress, f)
+                os.replace(temp_path, self.progress_path)
+            except OSError as e:
+                self.logger.warning(f"Could not write progress file: {e!s}")
+
+    def _check_stall(self, now: float, status: str) -> None:
+        """Flag (and log) a job with files in progress but no data moving."""
+        stalled = bool(
+            status == "RUNNING"
+            and self.stall_timeout
+            and self.current_files
+            and now - self._last_advance >= self.stall_timeout
+        )
+        if stalled and not self.stalled:
+            self.logger.warning(
+                f"Transfer stalled: no progress for {int(now - self._last_advance)}s on {', '.join(self.current_files)}"
+            )
+        elif self.stalled and not stalled and status == "RUNNING":
+            self.logger.info("Transfer resumed after a stall")
+        self.stalled = stalled
@@ -0,0 +1,76 @@
+import queue
+import threading
+
+
+class ReadAheadFile:
+    """File-like reader filling a ring of preallocated buffers ahead of its consumer.
+
+    A reader thread reads the next blocks (readinto, no allocation per block) while
+    the consumer sends the previous ones, so storage latency (e.g. NFS) and network
+    latency overlap instead of adding up. read() returns a memoryview of a ring
+    buffer, valid until the next call to read(): the consumer must be done with a
+    block before asking for the next one, as ftplib's storbinary loop is.
+    """
+
+    def __init__(self, file, blocksize: int, buffers: int = 4):
+        self._file = file
+        self._buffers = [bytearray(blocksize) for _ in range(max(2, buffers))]
+        # Indexes of the buffers free to be filled, and of the filled ones with
+        # their length (None at the end of the file, or the exception raised)
+        self._free: queue.Queue[int | None] = queue.Queue()
+        self._filled: queue.Queue[tuple[int | None, int | Exception]] = queue.Queue()
+        self._current: int | None = None
+        self._closed = False
+        self._eof = False
+
+        for index in range(len(self._buffers)):
+            self._free.put(index)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def read(self, size: int = -1) -> memoryview:
+        """Return the next block, the size is that of the buffers (size is ignored)."""
+        if self._current is not None:
+            self._free.put(self._current)
+            self._current = None
+        if self._eof:
+            return memoryview(b"")
+
+        index, result = self._filled.get()
+        if isinstance(result, Exception):
+            self._eof = True
+            raise result
+        if index is None:
+            self._eof = True
+            return memoryview(b"")
+
+        self._current = index
+        return memoryview(self._buffers[index])[:result]
+
+    def close(self) -> None:
+        """Stop the reader thread, the underlying file is left open."""
+        self._closed = True
+        # Wake up the reader if it waits for a free buffer
+        self._free.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            index = self._free.get()
+            if index is None or self._closed:
+                return
+            try:
+                nbytes = self._file.readinto(memoryview(self._buffers[index]))
+            except Exception as e:
+                self._filled.put((None, e))
+                return
+            if not nbytes:
+                self._filled.put((None, 0))
+                return
+            self._filled.put((index, nbytes))
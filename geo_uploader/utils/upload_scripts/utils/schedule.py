@@ -0,0 +1,37 @@
+import heapq
+from typing import Any
+
+from geo_uploader.utils.upload_scripts.utils.config_parser import ConfigParser
+
+# Orders of the transfer queue: largest files first (LPT, shortest total time over
+# parallel connections), processed files first (smallest first, so they are on the
+# server early for the metadata review) then raw files largest first, or INI order
+UPLOAD_ORDERS = ("largest_first", "processed_first", "ini")
+
+
+def order_files(files: list[dict[str, Any]], order: str) -> list[dict[str, Any]]:
+    """Return the files in the order they should be queued, using the INI sizes."""
+    if order == "largest_first":
+        return sorted(files, key=ConfigParser.get_file_size, reverse=True)
+    if order == "processed_first":
+        processed = [f for f in files if f.get("file_type") == "processed"]
+        others = [f for f in files if f.get("file_type") != "processed"]
+        return sorted(processed, key=ConfigParser.get_file_size) + sorted(
+            others, key=ConfigParser.get_file_size, reverse=True
+        )
+    return list(files)
+
+
+def predict_connection_loads(
+    files: list[dict[str, Any]], connections: int
+) -> list[int]:
+    """Bytes sent by each connection when the queued files are pulled by the first
+    free connection, assuming every connection has the same throughput.
+    The busiest connection determines the total time of the job."""
+    loads = [0] * max(1, connections)
+    heapq.heapify(loads)
+    for file_info in files:
+        heapq.heappush(
+            loads, heapq.heappop(loads) + ConfigParser.get_file_size(file_info)
+        )
+    return sorted(loads, reverse=True)
@@ -0,0 +1,165 @@
+import logging
+import os
+import tarfile
+from collections.abc import Iterator
+from typing import IO, Any
+
+from geo_uploader.utils.upload_scripts.utils.config_parser import ConfigParser
+
+# Magic numbers of the compressions tarfile reads (gzip, bzip2, xz)
+COMPRESSED_MAGIC = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")
+
+
+def is_tar_member(file_info: dict[str, Any]) -> bool:
+    """Whether the file is a member of a tar archive (see get_sample_files)."""
+    return bool(file_info.get("tar_path"))
+
+
+def is_compressed_tar(tar_path: str) -> bool:
+    """Whether the tar is compressed, its members then have to be streamed in order."""
+    with open(tar_path, "rb") as f:
+        head = f.read(6)
+    return head.startswith(COMPRESSED_MAGIC)
+
+
+def locate_tar_members(tar_path: str) -> list[tuple[str, int, int]]:
+    """Return (base name, data offset, size) of the regular files of an uncompressed
+    tar. Only the headers are read, the data of the members is skipped with seeks."""
+    with tarfile.open(tar_path, "r:") as tar:
+        return [
+            (os.path.basename(member.name), member.offset_data, member.size)
+            for member in tar
+            if member.isfile()
+        ]
+
+
+def match_member(
+    file_info: dict[str, Any], member_name: str, member_size: int
+) -> int:
+    """How well a member of a tar matches a file listed in the INI file: 2 when its
+    name is the one recorded for the file (tar_member), or the upload name, 1 when
+    the upload name only ends with it (INI files written without tar_member, where
+    the upload name may carry a prefix telling apart same-named members of several
+    tars), 0 when it does not match."""
+    size = ConfigParser.get_file_size(file_info)
+    if size and size != member_size:
+        return 0
+    if file_info.get("tar_member"):
+        return 2 if file_info["tar_member"] == member_name else 0
+    if file_info["file_name"] == member_name:
+        return 2
+    return 1 if file_info["file_name"].endswith(member_name) else 0
+
+
+def assign_member(
+    member_name: str,
+    member_size: int,
+    files: list[dict[str, Any]],
+    assigned: set[int],
+) -> dict[str, Any] | None:
+    """The listed file a member goes to, the best match (see match_member) among the
+    files not assigned yet, which is then added to assigned. The members are
+    assigned in the order of the archive, by both resolve_tar_members and
+    iter_tar_members, so that a tar gives the same mapping seeked or streamed."""
+    best, best_score = None, 0
+    for file_info in files:
+        if id(file_info) in assigned:
+            continue
+        score = match_member(file_info, member_name, member_size)
+        if score > best_score:
+            best, best_score = file_info, score
+    if best is not None:
+        assigned.add(id(best))
+    return best
+
+
+def resolve_tar_members(
+    files: list[dict[str, Any]], logger: logging.Logger
+) -> list[dict[str, Any]]:
+    """Set the 'offset' of the members of uncompressed tars, the start of their data
+    in the tar, scanning the headers of every tar once. Members of compressed tars
+    get an offset of None and are streamed (see iter_tar_members). Members which
+    cannot be found are left out with an error."""
+    files_by_tar: dict[str, list[dict[str, Any]]] = {}
+    for file_info in files:
+        if is_tar_member(file_info):
+            files_by_tar.setdefault(file_info["tar_path"], []).append(file_info)
+
+    # Offset of every listed file, None for the members of compressed tars
+    offsets: dict[int, int | None] = {}
+    for tar_path, tar_files in files_by_tar.items():
+        try:
+            if is_compressed_tar(tar_path):
+                offsets.update((id(file_info), None) for file_info in tar_files)
+                continue
+            members = locate_tar_members(tar_path)
+        except (OSError, tarfile.TarError) as e:
+            logger.error(f"Failed to read tar file {tar_path}: {e!s}")
+            continue
+        assigned: set[int] = set()
+        for name, offset, member_size in members:
+            file_info = assign_member(name, member_size, tar_files, assigned)
+            if file_info is not None:
+                offsets[id(file_info)] = offset
+
+    resolved = []
+    for file_info in files:
+        if not is_tar_member(file_info):
+            resolved.append(file_info)
+        elif id(file_info) in offsets:
+            resolved.append({**file_info, "offset": offsets[id(file_info)]})
+        else:
+            logger.error(f"{file_info['file_name']} not found in {file_info['tar_path']}")
+    return resolved
+
+
+def group_tar_streams(files: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Replace the members of every compressed tar by a single entry listing them in
+    'tar_members', so that the tar is decompressed once for all of them. The entry
+    has the sample, path and file name of the tar, and the total size of its members."""
+    grouped = []
+    streams: dict[str, dict[str, Any]] = {}
+    for file_info in files:
+        if not is_tar_member(file_info) or file_info.get("offset") is not None:
+            grouped.append(file_info)
+            continue
+
+        tar_path = file_info["tar_path"]
+        if tar_path not in streams:
+            streams[tar_path] = {
+                "sample": file_info.get("sample"),
+                "path": tar_path,
+                "file_type": file_info.get("file_type"),
+                "file_name": os.path.basename(tar_path),
+                "size": 0,
+                "tar_members": [],
+            }
+            grouped.append(streams[tar_path])
+        streams[tar_path]["size"] += ConfigParser.get_file_size(file_info)
+        streams[tar_path]["tar_members"].append(file_info)
+    return grouped
+
+
+def iter_tar_members(
+    tar_path: str,
+    files: list[dict[str, Any]],
+    entries: list[dict[str, Any]] | None = None,
+) -> Iterator[tuple[dict[str, Any], IO[bytes]]]:
+    """Decompress a tar in a single pass, yielding (file_info, reader) for each of the
+    listed members, in the order of the archive. A reader is only valid until the
+    next member is yielded. The members are assigned among entries, all the files
+    listed for the tar (default: files), so that reading a subset of them again
+    maps the members as the first pass did."""
+    pending = {id(file_info) for file_info in files}
+    assigned: set[int] = set()
+    with tarfile.open(tar_path, "r|*") as tar:
+        for member in tar:
+            if not pending:
+                return
+            if not member.isfile():
+                continue
+            name = os.path.basename(member.name)
+            file_info = assign_member(name, member.size, entries or files, assigned)
+            if file_info is not None and id(file_info) in pending:
+                pending.discard(id(file_info))
+                yield file_info, tar.extractfile(member)
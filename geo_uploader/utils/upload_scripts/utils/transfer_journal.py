@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+
+class TransferJournal:
+    """Append-only record of the files an upload job finished transferring.
+
+    One JSON object per line, flushed and fsynced after every file, so a restarted
+    job knows which files were completed even if it cannot list the server. An
+    entry only matches while the local file keeps the size and mtime it was
+    uploaded with.
+    """
+
+    def __init__(self, journal_path: str, logger: logging.Logger):
+        self.journal_path = journal_path
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._load()
+
+    def is_done(self, local_path: str, remote_path: str) -> bool:
+        """Whether the local file, unchanged since, was uploaded to remote_path."""
+        entry = self._entries.get(local_path)
+        if not entry or entry["remote_path"] != remote_path:
+            return False
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return False
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def record(self, local_path: str, remote_path: str) -> None:
+        """Record a completed (and verified) upload."""
+        try:
+            stat = os.stat(local_path)
+            entry = {
+                "local_path": local_path,
+                "remote_path": remote_path,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "completed_at": datetime.now().isoformat(),
+            }
+            with self._lock:
+                with open(self.journal_path, "a") as journal_file:
+                    journal_file.write(json.dumps(entry) + "\n")
+                    journal_file.flush()
+                    os.fsync(journal_file.fileno())
+                self._entries[local_path] = entry
+        except OSError as e:
+            self.logger.warning(f"Could not record {local_path} in the journal: {e!s}")
+
+    def _load(self) -> None:
+        """Read the entries of previous runs, ignoring a partially written last line."""
+        if not os.path.isfile(self.journal_path):
+            return
+        try:
+            with open(self.journal_path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry["local_path"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError as e:
+            self.logger.warning(f"Could not read transfer journal: {e!s}")
+        if self._entries:
+            self.logger.info(
+                f"Transfer journal lists {len(self._entries)} completed files"
+            )
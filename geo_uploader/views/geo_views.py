@@ -4,6 +4,7 @@ from flask import Blueprint, abort, flash, redirect, url_for
 from flask_login import login_required
 
 from geo_uploader.decorators import session_owner_required
+from geo_uploader.extensions import db
 from geo_uploader.forms import (
     SessionDeleteGEOForm,
     SessionRetrieveGEOForm,
@@ -13,6 +14,10 @@ from geo_uploader.models import UploadSessionModel
 from geo_uploader.services.external.ftp_service import FTPService
 from geo_uploader.services.file_service import FileService
 from geo_uploader.services.session_cache_service import SessionCacheService
+from geo_uploader.services.session_upload_service import (
+    JobSubmissionError,
+    SessionUploadService,
+)
 
 geo = Blueprint("geo", __name__)
 
@@ -56,8 +61,23 @@ def retrieve_geo(id):
 @login_required
 @session_owner_required
 def reupload_files(id):
+    """
+    Launches the upload job again in sync mode, only the files missing on the server
+    or with a different size are uploaded
+    """
     form = SessionReuploadGEOForm()
     if form.validate_on_submit():
+        _session = UploadSessionModel.get_by_id(id)
+        if _session is None:
+            flash(f"Session with ID {id} not found", "error")
+            return redirect(url_for("main.dashboard"))
+
+        try:
+            SessionUploadService(db.session).resubmit_upload(_session)
+        except JobSubmissionError as e:
+            flash(f"Could not launch the upload job: {e!s}", "danger")
+            return redirect(url_for("progress.progress_session_upload", id=id))
+
         flash("Reuploading of selected files job launched!", "success")
         return redirect(url_for("progress.progress_session_upload", id=id))
     abort(403)
@@ -44,6 +44,7 @@ def progress_session_md5(id):
     sample_parser_service = SampleParserService()
 
     job_info = job_service.get_job_info(_session.md5_job_id)
+    queue_position = job_service.get_queue_position(_session.md5_job_id)
     status_class = STATUS_CLASS.get(job_info["status"]) if job_info else "NO_JOB_STATUS"
     upload_samples_path = file_service.get_session_folderpath(
         _session.session_title, "upload_samples.ini"
@@ -64,14 +65,52 @@ def progress_session_md5(id):
     )
     # print('disc: ', discrepancies)
     discrepancies = []
+    md5_progress = _read_md5_progress(_session, file_service)
+    fastq_stats = file_service.read_fastq_stats(
+        file_service.get_session_folderpath(_session.session_title, "fastq_stats.tsv")
+    )
     return render_template(
         "progress/md5_progress.html",
         job_info=job_info,
         name=_session.session_title,
+        session_id=id,
         status_class=status_class,
         discrepancies=discrepancies,
         local_samples=local_samples,
         md5_samples=md5_samples,
+        job_progress=md5_progress,
+        single_pass=_is_single_pass(_session),
+        queue_position=queue_position,
+        job_progress_url=url_for("progress.progress_session_md5_status", id=id),
+        fastq_stats=fastq_stats,
+    )
+
+
+@progress.route("/sessions/<id>/progress/md5/status", methods=["GET"])
+@login_required
+@session_owner_required
+def progress_session_md5_status(id):
+    """
+    AJAX endpoint polled by the MD5 progress page,
+    returns the job status and the progress published by bulk_md5
+    """
+    _session = UploadSessionModel.get_by_id(id)
+    if _session is None:
+        return jsonify({"success": False, "error": "Session not found"}), 404
+
+    job_service = JobService()
+    file_service = FileService()
+
+    job_info = job_service.get_job_info(_session.md5_job_id)
+    queue_position = job_service.get_queue_position(_session.md5_job_id)
+    md5_progress = _read_md5_progress(_session, file_service)
+    return jsonify(
+        {
+            "success": True,
+            "status": job_info["status"] if job_info else None,
+            "queue_position": queue_position,
+            "progress": md5_progress,
+        }
     )
 
 
@@ -98,6 +137,7 @@ def progress_session_upload(id):
     sample_parser_service = SampleParserService()
 
     job_info = job_service.get_job_info(_session.upload_job_id)
+    queue_position = job_service.get_queue_position(_session.upload_job_id)
     status_class = STATUS_CLASS.get(job_info["status"]) if job_info else False
 
     # gather local files
@@ -117,6 +157,12 @@ def progress_session_upload(id):
         [[file[0], int(file[1]), file[2]] for file in files_geo] if files_geo else []
     )
 
+    upload_progress = file_service.read_progress_file(
+        file_service.get_session_folderpath(
+            _session.session_title, "upload_progress.json"
+        )
+    )
+
     retrieveGEOForm = SessionRetrieveGEOForm()
     deleteGEOForm = SessionDeleteGEOForm()
     reuploadGEOForm = SessionReuploadGEOForm()
@@ -135,6 +181,41 @@ def progress_session_upload(id):
         status_class=status_class,
         local_samples=local_samples,
         files_geo=files_geo,
+        job_progress=upload_progress,
+        queue_position=queue_position,
+        job_progress_url=url_for("progress.progress_session_upload_status", id=id),
+    )
+
+
+@progress.route("/sessions/<id>/progress/upload/status", methods=["GET"])
+@login_required
+@session_owner_required
+def progress_session_upload_status(id):
+    """
+    AJAX endpoint polled by the upload progress page,
+    returns the job status and the progress published by bulk_upload
+    """
+    _session = UploadSessionModel.get_by_id(id)
+    if _session is None:
+        return jsonify({"success": False, "error": "Session not found"}), 404
+
+    job_service = JobService()
+    file_service = FileService()
+
+    job_info = job_service.get_job_info(_session.upload_job_id)
+    queue_position = job_service.get_queue_position(_session.upload_job_id)
+    upload_progress = file_service.read_progress_file(
+        file_service.get_session_folderpath(
+            _session.session_title, "upload_progress.json"
+        )
+    )
+    return jsonify(
+        {
+            "success": True,
+            "status": job_info["status"] if job_info else None,
+            "queue_position": queue_position,
+            "progress": upload_progress,
+        }
     )
 
 
@@ -206,3 +287,20 @@ def finish_md5(id):
     db.session.commit()
 
     return jsonify({"success": True})
+
+
+def _is_single_pass(_session: UploadSessionModel) -> bool:
+    """Whether the checksums of the session are computed by its upload job, which
+    then holds both job ids (SINGLE_PASS_TRANSFER)"""
+    return _session.md5_job_id != -1 and _session.md5_job_id == _session.upload_job_id
+
+
+def _read_md5_progress(_session: UploadSessionModel, file_service: FileService):
+    """Progress of the MD5 job of the session. In single-pass mode the files are
+    hashed as they are sent, so this is the progress of the upload job."""
+    progress_file = (
+        "upload_progress.json" if _is_single_pass(_session) else "md5_progress.json"
+    )
+    return file_service.read_progress_file(
+        file_service.get_session_folderpath(_session.session_title, progress_file)
+    )
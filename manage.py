@@ -237,6 +237,22 @@ def start_prod_background(port, host):
         sys.exit(1)
 
 
+@application.cli.command("jobs-worker")
+@click.option(
+    "--poll-interval", default=2.0, help="Seconds between two checks of the queue"
+)
+def jobs_worker(poll_interval):
+    """Run the background jobs (MD5, upload) queued by the web server."""
+    from geo_uploader.services.external.job_runner import JobRunner
+
+    try:
+        with application.app_context():
+            JobRunner(logger=application.logger).run(poll_interval=poll_interval)
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        sys.exit(1)
+
+
 @application.cli.command("status")
 def status():
     """Check the status of development and production servers."""
@@ -0,0 +1,4 @@
+import os
+
+# Importing geo_uploader loads its config, which needs a secret key (from .env)
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
@@ -0,0 +1,121 @@
+"""Resuming an upload whose data connection is cut in the middle of the transfer,
+against a local pyftpdlib server."""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import ClassVar
+
+import pytest
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import DTPHandler, FTPHandler
+from pyftpdlib.servers import FTPServer
+
+from geo_uploader.utils.upload_scripts.utils import StreamHasher
+from geo_uploader.utils.upload_scripts.utils.ftp import (
+    CountingFTP,
+    connect_ftp,
+    upload_file,
+)
+
+FILE_SIZE = 4 * 1024 * 1024
+DROP_AFTER = 1024 * 1024
+
+
+class DroppingDTPHandler(DTPHandler):
+    """Closes the first data connection after DROP_AFTER bytes, answering 426."""
+
+    drops_left = 1
+
+    def handle_read(self):
+        super().handle_read()
+        if self.drops_left and self.tot_bytes_received >= DROP_AFTER:
+            DroppingDTPHandler.drops_left -= 1
+            self._resp = ("426 Connection closed; transfer aborted.", logging.info)
+            self.close()
+
+    handle_read_event = handle_read
+
+
+class RecordingFTPHandler(FTPHandler):
+    """Records the transfer commands received by the server."""
+
+    dtp_handler = DroppingDTPHandler
+    commands: ClassVar[list[str]] = []
+
+    def pre_process_command(self, line, cmd, arg):
+        if cmd in ("REST", "STOR", "APPE"):
+            self.commands.append(f"{cmd} {arg}")
+        return super().pre_process_command(line, cmd, arg)
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / "local" / "sample_R1.fastq.gz"
+    path.parent.mkdir()
+    path.write_bytes(os.urandom(FILE_SIZE))
+    return path
+
+
+@pytest.fixture(params=["rest", "appe"])
+def ftp_server(request, tmp_path):
+    """Server rooted in tmp_path/remote, without REST for the "appe" variant."""
+    root = tmp_path / "remote"
+    root.mkdir()
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("geo", "pw", str(root), perm="elradfmwMT")
+
+    proto_cmds = dict(FTPHandler.proto_cmds)
+    if request.param == "appe":
+        del proto_cmds["REST"]
+    handler = type(
+        "Handler",
+        (RecordingFTPHandler,),
+        {"authorizer": authorizer, "proto_cmds": proto_cmds, "commands": []},
+    )
+    DroppingDTPHandler.drops_left = 1
+
+    server = FTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"timeout": 0.1}, daemon=True
+    )
+    thread.start()
+    yield request.param, server.address[1], root, handler
+    server.close_all()
+    thread.join(timeout=5)
+
+
+def test_upload_resumes_after_dropped_data_connection(ftp_server, local_file):
+    mode, port, root, handler = ftp_server
+    logger = logging.getLogger(__name__)
+    config = {"server": "127.0.0.1", "username": "geo", "password": "pw"}
+
+    ftp = CountingFTP()
+    ftp.port = port
+    assert connect_ftp(config, logger, ftp=ftp) is ftp
+    hasher = StreamHasher()
+    try:
+        assert upload_file(
+            ftp, str(local_file), "/uploads/sample_R1.fastq.gz", logger, hasher=hasher
+        )
+    finally:
+        ftp.close()
+
+    # The transfer continued from the partial file instead of starting over
+    stores = [c for c in handler.commands if not c.startswith("REST")]
+    assert stores[0] == "STOR /uploads/sample_R1.fastq.gz"
+    if mode == "rest":
+        assert len(handler.commands) == 3
+        offset = int(handler.commands[1].split()[1])
+        assert DROP_AFTER <= offset < FILE_SIZE
+        assert stores[1:] == ["STOR /uploads/sample_R1.fastq.gz"]
+    else:
+        # REST is refused, the rest of the file is appended
+        assert stores[1:] == ["APPE /uploads/sample_R1.fastq.gz"]
+
+    local_md5 = hashlib.md5(local_file.read_bytes()).hexdigest()
+    remote_file = root / "uploads" / "sample_R1.fastq.gz"
+    assert remote_file.stat().st_size == FILE_SIZE
+    assert hashlib.md5(remote_file.read_bytes()).hexdigest() == local_md5
+    assert hasher.hexdigest() == local_md5